@@ -1,12 +1,20 @@
 import os
+import gc
 import json
+import math
+import hashlib
+import csv
 import uuid
+import queue
 import sqlite3
-import random
-import string
+import secrets
 import time
-from datetime import datetime
+from contextlib import contextmanager
+from datetime import date, datetime
+from functools import lru_cache
+from typing import Iterator
 
+import orjson
 import pandas as pd
 import streamlit as st
 from reportlab.lib.pagesizes import A4
@@ -15,6 +23,7 @@ from reportlab.lib.units import cm
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.enums import TA_CENTER
+from reportlab.pdfbase.pdfmetrics import stringWidth
 
 APP_TITLE = "RCP Bandelette — saisie structurée (offline)"
 
@@ -26,6 +35,29 @@ PDF_DIR = os.path.join(APP_EXPORT_DIR, "pdf")
 CSV_DIR = os.path.join(APP_EXPORT_DIR, "csv")
 
 
+def _json_encode(obj) -> str:
+    """Sérialise en JSON compact (UTF-8, sans espaces) pour stocker les payloads des fiches."""
+    return orjson.dumps(obj).decode()
+
+
+def _json_decode(text):
+    """Décode un payload JSON ; repli sur json pour les anciens payloads contenant NaN/Infinity (refusés par orjson)."""
+    try:
+        return orjson.loads(text)
+    except orjson.JSONDecodeError:
+        return json.loads(text)
+
+
+# Nombre de PDF générés entre deux passages du ramasse-miettes lors d'un export de RCP
+PDF_GC_INTERVAL = 20
+
+# Noms des mois en français, indexés par mois - 1
+_MOIS_FR = (
+    "janvier", "février", "mars", "avril", "mai", "juin",
+    "juillet", "août", "septembre", "octobre", "novembre", "décembre"
+)
+
+
 # ---------------------------
 # Utils: filesystem & database
 # ---------------------------
@@ -36,9 +68,22 @@ def ensure_dirs():
     os.makedirs(CSV_DIR, exist_ok=True)
 
 
-def get_conn():
-    """Obtient une connexion SQLite avec optimisations."""
-    conn = sqlite3.connect(DB_PATH, check_same_thread=False)
+# Requêtes fréquentes partagées par plusieurs fonctions : un seul texte SQL par requête,
+# donc une seule entrée dans le cache d'instructions préparées de la connexion
+_SQL_TOUCH_RCP = "UPDATE rcp SET updated_at = ? WHERE code = ?"
+_SQL_RCP_EXISTS = "SELECT code FROM rcp WHERE code = ?"
+_SQL_GET_RCP_DATE = "SELECT date_rcp FROM rcp WHERE code = ?"
+_SQL_GET_RCP_MEDECINS = "SELECT medecins_presents FROM rcp WHERE code = ?"
+_SQL_GET_FICHE_RCP_CODE = "SELECT rcp_code FROM fiches WHERE id = ?"
+
+# Code étendu SQLITE_BUSY_SNAPSHOT (constante du module sqlite3 seulement depuis Python 3.11)
+_SQLITE_BUSY_SNAPSHOT = getattr(sqlite3, "SQLITE_BUSY_SNAPSHOT", 517)
+
+
+def _open_conn() -> sqlite3.Connection:
+    """Ouvre une connexion SQLite et lui applique les PRAGMAs de l'application."""
+    # Mode autocommit : les transactions d'écriture sont ouvertes explicitement par db_write
+    conn = sqlite3.connect(DB_PATH, check_same_thread=False, isolation_level=None, cached_statements=256)
     cur = conn.cursor()
     # Activer WAL mode pour meilleures performances en lecture/écriture concurrente
     cur.execute("PRAGMA journal_mode=WAL")
@@ -46,9 +91,57 @@ def get_conn():
     cur.execute("PRAGMA busy_timeout=5000")
     # Activer les clés étrangères
     cur.execute("PRAGMA foreign_keys=ON")
+    # En mode WAL, NORMAL reste sûr et évite un fsync à chaque commit
+    cur.execute("PRAGMA synchronous=NORMAL")
+    # Lecture des pages via mmap (256 Mo) plutôt que par appels read()
+    cur.execute("PRAGMA mmap_size=268435456")
+    # Tables et index temporaires en mémoire
+    cur.execute("PRAGMA temp_store=MEMORY")
+    # Cache de pages de 20 Mo (valeur négative = taille en Kio)
+    cur.execute("PRAGMA cache_size=-20000")
+    # Checkpoint WAL automatique toutes les 1000 pages
+    cur.execute("PRAGMA wal_autocheckpoint=1000")
     return conn
 
 
+class SQLiteConnectionPool:
+    """
+    Pool de connexions SQLite persistantes, partagé par tout le processus.
+    
+    Chaque appelant emprunte une connexion le temps d'un `with pool.connection() as conn:` :
+    les threads ne partagent jamais une connexion (ni donc une transaction), et les connexions
+    rendues gardent leur cache de pages. Pool vide : une connexion supplémentaire est ouverte
+    plutôt que d'attendre ; au-delà de `size` connexions inactives, elle est fermée au retour.
+    """
+    
+    def __init__(self, size: int = 4):
+        # LIFO : la connexion la plus récemment utilisée, au cache le plus chaud, ressort en premier
+        self._idle = queue.LifoQueue(maxsize=size)
+    
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            conn = _open_conn()
+        try:
+            yield conn
+        finally:
+            # Ne jamais remettre dans le pool une connexion avec une transaction ouverte
+            if conn.in_transaction:
+                conn.rollback()
+            try:
+                self._idle.put_nowait(conn)
+            except queue.Full:
+                conn.close()
+
+
+@st.cache_resource
+def get_pool() -> SQLiteConnectionPool:
+    """Obtient le pool de connexions SQLite, créé une seule fois par processus."""
+    return SQLiteConnectionPool()
+
+
 def db_write(fn, retries=5):
     """
     Exécute une fonction d'écriture avec retry exponentiel en cas d'erreur de verrouillage.
@@ -63,64 +156,73 @@ def db_write(fn, retries=5):
     Raises:
         sqlite3.OperationalError: Si toutes les tentatives échouent
     """
-    for attempt in range(retries):
-        try:
-            conn = get_conn()
+    with get_pool().connection() as conn:
+        for attempt in range(retries):
             try:
                 cur = conn.cursor()
-                result = fn(conn, cur)
-                conn.commit()
-                return result
-            finally:
-                conn.close()
-        except sqlite3.OperationalError as e:
-            error_msg = str(e).lower()
-            if 'locked' in error_msg or 'busy' in error_msg:
-                if attempt < retries - 1:
-                    # Backoff exponentiel : 0.01s, 0.02s, 0.04s, 0.08s, 0.16s
-                    wait_time = 0.01 * (2 ** attempt)
-                    time.sleep(wait_time)
-                    continue
-            # Si ce n'est pas une erreur de verrouillage, ou si on a épuisé les tentatives, relancer
-            raise
+                # BEGIN IMMEDIATE prend le verrou d'écriture dès le début : les écrivains des autres
+                # connexions attendent (busy_timeout) et aucun SQLITE_BUSY_SNAPSHOT n'est possible
+                cur.execute("BEGIN IMMEDIATE")
+                try:
+                    result = fn(conn, cur)
+                    cur.execute("COMMIT")
+                    return result
+                except BaseException:
+                    if conn.in_transaction:
+                        cur.execute("ROLLBACK")
+                    raise
+            except sqlite3.OperationalError as e:
+                error_msg = str(e).lower()
+                # sqlite_errorcode n'existe que depuis Python 3.11 : repli sur le message d'erreur
+                if getattr(e, "sqlite_errorcode", None) == _SQLITE_BUSY_SNAPSHOT or 'locked' in error_msg or 'busy' in error_msg:
+                    if attempt < retries - 1:
+                        # Backoff exponentiel : 0.01s, 0.02s, 0.04s, 0.08s, 0.16s
+                        wait_time = 0.01 * (2 ** attempt)
+                        time.sleep(wait_time)
+                        continue
+                # Si ce n'est pas une erreur de verrouillage, ou si on a épuisé les tentatives, relancer
+                raise
     raise sqlite3.OperationalError("Échec après toutes les tentatives de retry")
 
 
 def generate_rcp_code() -> str:
-    """Génère un code RCP unique à 6 caractères alphanumériques."""
-    chars = string.ascii_uppercase + string.digits
-    conn = get_conn()
-    try:
-        cur = conn.cursor()
-        for _ in range(100):  # Limiter les tentatives
-            code = ''.join(random.choices(chars, k=6))
-            cur.execute("SELECT code FROM rcp WHERE code = ?", (code,))
-            if cur.fetchone() is None:
-                return code
-        raise ValueError("Impossible de générer un code RCP unique")
-    finally:
-        conn.close()
+    """
+    Génère un code RCP aléatoire à 6 caractères hexadécimaux (0-9, A-F).
+    
+    Aucun accès à la base : l'unicité est garantie par la clé primaire à l'insertion.
+    """
+    return secrets.token_hex(3).upper()
+
+
+def _insert_new_rcp(cur, date_rcp, now: str) -> str:
+    """Insère une RCP sous un nouveau code, dans la transaction en cours, et retourne ce code."""
+    for _ in range(100):  # Limiter les tentatives
+        code = generate_rcp_code()
+        cur.execute(
+            "INSERT OR IGNORE INTO rcp (code, date_rcp, created_at, updated_at) VALUES (?, ?, ?, ?)",
+            (code, date_rcp, now, now)
+        )
+        # Aucune ligne insérée : le code existe déjà, en tirer un autre
+        if cur.rowcount:
+            return code
+    raise ValueError("Impossible de générer un code RCP unique")
 
 
 def migrate_db():
     """Migre la base de données depuis l'ancienne structure vers la nouvelle."""
-    # Lecture seule pour vérifier la structure
-    conn = get_conn()
-    cur = conn.cursor()
-    
-    # Vérifier si la table rcp existe
-    cur.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='rcp'")
-    rcp_exists = cur.fetchone() is not None
-    
-    # Vérifier si la colonne rcp_code existe dans fiches
-    cur.execute("PRAGMA table_info(fiches)")
-    columns = [col[1] for col in cur.fetchall()]
-    has_rcp_code = "rcp_code" in columns
-    
-    conn.close()
-    
-    # Écritures avec retry
-    def _migrate_tables(conn, cur):
+    # Sondage en simple lecture : la transaction d'écriture n'est ouverte que si une migration est nécessaire
+    with get_pool().connection() as conn:
+        rcp_columns = {col[1] for col in conn.execute("PRAGMA table_info(rcp)")}
+        fiches_columns = {col[1] for col in conn.execute("PRAGMA table_info(fiches)")}
+    if {"date_rcp", "is_archived", "medecins_presents"} <= rcp_columns and "rcp_code" in fiches_columns:
+        return
+    
+    # Vérifications refaites sous le verrou d'écriture (un autre processus a pu migrer entre-temps)
+    def _migrate(conn, cur):
+        # Vérifier si la table rcp existe
+        cur.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='rcp'")
+        rcp_exists = cur.fetchone() is not None
+        
         if not rcp_exists:
             # Créer la table RCP
             cur.execute(
@@ -145,38 +247,31 @@ def migrate_db():
             # Vérifier si la colonne medecins_presents existe
             if "medecins_presents" not in rcp_columns:
                 cur.execute("ALTER TABLE rcp ADD COLUMN medecins_presents TEXT")
-    
-    db_write(_migrate_tables)
-    
-    if not has_rcp_code:
-        # Générer un code RCP unique pour les fiches existantes
-        chars = string.ascii_uppercase + string.digits
-        default_rcp_code = None
-        conn = get_conn()
-        try:
-            cur = conn.cursor()
-            for _ in range(100):  # Essayer jusqu'à 100 fois
-                code = ''.join(random.choices(chars, k=6))
-                cur.execute("SELECT code FROM rcp WHERE code = ?", (code,))
-                if cur.fetchone() is None:
-                    default_rcp_code = code
-                    break
-        finally:
-            conn.close()
-        
-        if default_rcp_code:
-            def _migrate_rcp_code(conn, cur):
-                now = datetime.now().isoformat(timespec="seconds")
-                cur.execute(
-                    "INSERT INTO rcp (code, created_at, updated_at) VALUES (?, ?, ?)",
-                    (default_rcp_code, now, now)
-                )
-                
-                # Ajouter la colonne rcp_code
-                cur.execute(f"ALTER TABLE fiches ADD COLUMN rcp_code TEXT")
-                cur.execute(f"UPDATE fiches SET rcp_code = ? WHERE rcp_code IS NULL", (default_rcp_code,))
+        
+        # Vérifier si la colonne rcp_code existe dans fiches
+        cur.execute("PRAGMA table_info(fiches)")
+        columns = [col[1] for col in cur.fetchall()]
+        if "rcp_code" not in columns:
+            # Rattacher les fiches existantes à une RCP créée sous un nouveau code
+            now = datetime.now().isoformat(timespec="seconds")
+            default_rcp_code = _insert_new_rcp(cur, None, now)
             
-            db_write(_migrate_rcp_code)
+            # Ajouter la colonne rcp_code
+            cur.execute("ALTER TABLE fiches ADD COLUMN rcp_code TEXT")
+            cur.execute("UPDATE fiches SET rcp_code = ? WHERE rcp_code IS NULL", (default_rcp_code,))
+    
+    db_write(_migrate)
+
+
+# Tables et index créés par init_db
+_SCHEMA_OBJECTS = {
+    ("table", "rcp"),
+    ("table", "fiches"),
+    ("index", "idx_fiches_rcp_code_id"),
+    ("index", "idx_fiches_updated_at"),
+    ("index", "idx_rcp_date_rcp"),
+    ("index", "idx_rcp_updated_at"),
+}
 
 
 def init_db():
@@ -209,76 +304,110 @@ def init_db():
         )
         
         # Créer des index pour accélérer les requêtes fréquentes
-        cur.execute("CREATE INDEX IF NOT EXISTS idx_fiches_rcp_code ON fiches(rcp_code)")
+        # Index couvrant (rcp_code, id) : le comptage des fiches par RCP se fait sans lire la table
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_fiches_rcp_code_id ON fiches(rcp_code, id)")
+        # L'ancien index sur rcp_code seul est un préfixe du précédent
+        cur.execute("DROP INDEX IF EXISTS idx_fiches_rcp_code")
         cur.execute("CREATE INDEX IF NOT EXISTS idx_fiches_updated_at ON fiches(updated_at)")
         cur.execute("CREATE INDEX IF NOT EXISTS idx_rcp_date_rcp ON rcp(date_rcp)")
         cur.execute("CREATE INDEX IF NOT EXISTS idx_rcp_updated_at ON rcp(updated_at)")
     
-    db_write(_init_tables)
+    # Sondage en simple lecture : le verrou d'écriture n'est pris que s'il reste quelque chose à créer
+    with get_pool().connection() as conn:
+        present = set(conn.execute("SELECT type, name FROM sqlite_master WHERE type IN ('table', 'index')").fetchall())
+    if not _SCHEMA_OBJECTS <= present or ("index", "idx_fiches_rcp_code") in present:
+        db_write(_init_tables)
 
     # Migrer si nécessaire
     migrate_db()
 
 
+@st.cache_resource
+def init_db_once() -> bool:
+    """Initialise et migre la base une seule fois par processus, et non à chaque rerun."""
+    init_db()
+    return True
+
+
 def create_rcp(date_rcp: str) -> str:
     """Crée une nouvelle RCP avec une date et retourne son code."""
-    code = generate_rcp_code()
     now = datetime.now().isoformat(timespec="seconds")
     
     def _create_rcp(conn, cur):
-        cur.execute(
-            "INSERT INTO rcp (code, date_rcp, created_at, updated_at) VALUES (?, ?, ?, ?)",
-            (code, date_rcp, now, now)
-        )
+        return _insert_new_rcp(cur, date_rcp, now)
     
-    db_write(_create_rcp)
+    code = db_write(_create_rcp)
     # Invalider le cache
-    get_all_rcp.clear()
+    clear_rcp_list_cache()
+    get_rcp.clear(code)
+    get_rcp_date.clear()
+    get_rcp_medecins_presents.clear()
     return code
 
 
-@st.cache_data(ttl=2)  # Cache pendant 2 secondes pour éviter les requêtes répétées
+# Colonnes d'une RCP telles que retournées par get_all_rcp / get_rcp
+# (sous-requête corrélée plutôt que LEFT JOIN + GROUP BY : comptage sur l'index couvrant)
+_SQL_SELECT_RCP = """
+    SELECT r.code, r.date_rcp, r.created_at, r.updated_at, 
+           COALESCE(r.is_archived, 0) as is_archived,
+           (SELECT COUNT(*) FROM fiches f WHERE f.rcp_code = r.code) as nb_fiches
+    FROM rcp r
+"""
+
+
+def _read_rcp_rows(query: str, params: tuple = ()) -> list:
+    """Exécute une requête sur les RCP et retourne les lignes sous forme de dicts."""
+    with get_pool().connection() as conn:
+        cur = conn.cursor()
+        # Lignes nommées sur ce curseur seulement : les autres lectures restent en tuples
+        cur.row_factory = sqlite3.Row
+        cur.execute(query, params)
+        results = [dict(r) for r in cur]
+    for r in results:
+        r["is_archived"] = bool(r["is_archived"])
+    return results
+
+
+@st.cache_data(ttl=60)  # Invalidé explicitement à chaque écriture (création, fiches, archivage, suppression)
 def get_all_rcp() -> list:
     """Retourne la liste de toutes les RCP avec le nombre de fiches."""
-    conn = get_conn()
-    try:
-        cur = conn.cursor()
-        cur.execute("""
-            SELECT r.code, r.date_rcp, r.created_at, r.updated_at, 
-                   COALESCE(r.is_archived, 0) as is_archived, COUNT(f.id) as nb_fiches
-            FROM rcp r
-            LEFT JOIN fiches f ON r.code = f.rcp_code
-            GROUP BY r.code, r.date_rcp, r.created_at, r.updated_at, r.is_archived
-            ORDER BY r.date_rcp DESC, r.updated_at DESC
-        """)
-        results = cur.fetchall()
-        return [{"code": r[0], "date_rcp": r[1], "created_at": r[2], "updated_at": r[3], "is_archived": bool(r[4]), "nb_fiches": r[5]} for r in results]
-    finally:
-        conn.close()
+    return _read_rcp_rows(_SQL_SELECT_RCP + "ORDER BY r.date_rcp DESC, r.updated_at DESC")
+
+
+@st.cache_data(ttl=60)  # Invalidé avec get_all_rcp
+def get_all_rcp_except(rcp_code: str) -> list:
+    """Retourne les RCP autres que rcp_code (même ordre et mêmes champs que get_all_rcp)."""
+    return _read_rcp_rows(_SQL_SELECT_RCP + "WHERE r.code != ? ORDER BY r.date_rcp DESC, r.updated_at DESC", (rcp_code,))
+
+
+def clear_rcp_list_cache():
+    """Invalide les listes de RCP mises en cache (après toute écriture sur les RCP ou leurs fiches)."""
+    get_all_rcp.clear()
+    get_all_rcp_except.clear()
+    _transfer_options.clear()
+
+
+@st.cache_data(ttl=2)  # Cache pendant 2 secondes
+def get_rcp(rcp_code: str) -> dict:
+    """Retourne une RCP par son code (mêmes champs que get_all_rcp), ou None."""
+    rows = _read_rcp_rows(_SQL_SELECT_RCP + "WHERE r.code = ?", (rcp_code,))
+    return rows[0] if rows else None
 
 
+@st.cache_data(ttl=300)  # La date d'une RCP ne change pas après création
 def get_rcp_date(rcp_code: str) -> str:
     """Récupère la date d'une RCP spécifique."""
-    conn = get_conn()
-    try:
-        cur = conn.cursor()
-        cur.execute("SELECT date_rcp FROM rcp WHERE code = ?", (rcp_code,))
-        result = cur.fetchone()
-        return result[0] if result and result[0] else ''
-    finally:
-        conn.close()
+    with get_pool().connection() as conn:
+        result = conn.execute(_SQL_GET_RCP_DATE, (rcp_code,)).fetchone()
+    return result[0] if result and result[0] else ''
 
 
+@st.cache_data(ttl=5)  # Cache pendant 5 secondes
 def get_rcp_medecins_presents(rcp_code: str) -> str:
     """Récupère la liste des médecins présents d'une RCP."""
-    conn = get_conn()
-    try:
-        cur = conn.cursor()
-        cur.execute("SELECT medecins_presents FROM rcp WHERE code = ?", (rcp_code,))
-        result = cur.fetchone()
-        return result[0] if result and result[0] else ''
-    finally:
-        conn.close()
+    with get_pool().connection() as conn:
+        result = conn.execute(_SQL_GET_RCP_MEDECINS, (rcp_code,)).fetchone()
+    return result[0] if result and result[0] else ''
 
 
 def update_rcp_medecins_presents(rcp_code: str, medecins_presents: str):
@@ -293,7 +422,9 @@ def update_rcp_medecins_presents(rcp_code: str, medecins_presents: str):
     
     db_write(_update_medecins)
     # Invalider le cache
-    get_all_rcp.clear()
+    clear_rcp_list_cache()
+    get_rcp.clear(rcp_code)
+    get_rcp_medecins_presents.clear()
 
 
 def archive_rcp(rcp_code: str, archived: bool = True):
@@ -308,7 +439,8 @@ def archive_rcp(rcp_code: str, archived: bool = True):
     
     db_write(_archive_rcp)
     # Invalider le cache
-    get_all_rcp.clear()
+    clear_rcp_list_cache()
+    get_rcp.clear(rcp_code)
 
 
 def delete_rcp(rcp_code: str):
@@ -319,149 +451,329 @@ def delete_rcp(rcp_code: str):
     
     db_write(_delete_rcp)
     # Invalider le cache
-    get_all_rcp.clear()
-    load_fiches.clear()
+    get_rcp_date.clear()
+    get_rcp_medecins_presents.clear()
+    invalidate_fiches_cache(rcp_code)
 
 
 def upsert_fiche(fiche_id: str, rcp_code: str, payload: dict):
     now = datetime.now().isoformat(timespec="seconds")
-    
-    # Vérifier si la fiche existe (lecture seule)
-    conn = get_conn()
-    try:
-        cur = conn.cursor()
-        cur.execute("SELECT id FROM fiches WHERE id = ?", (fiche_id,))
-        exists = cur.fetchone() is not None
-    finally:
-        conn.close()
+    # Sérialisation hors du verrou d'écriture
+    payload_json = _json_encode(payload)
     
     def _upsert_fiche(conn, cur):
-        if exists:
-            cur.execute(
-                "UPDATE fiches SET updated_at = ?, payload_json = ? WHERE id = ?",
-                (now, json.dumps(payload, ensure_ascii=False), fiche_id),
-            )
-        else:
-            cur.execute(
-                "INSERT INTO fiches (id, rcp_code, created_at, updated_at, payload_json) VALUES (?, ?, ?, ?, ?)",
-                (fiche_id, rcp_code, now, now, json.dumps(payload, ensure_ascii=False)),
-            )
+        # Insertion ou mise à jour en une seule instruction (created_at et rcp_code conservés si la fiche existe)
+        cur.execute(
+            """
+            INSERT INTO fiches (id, rcp_code, created_at, updated_at, payload_json) VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(id) DO UPDATE SET updated_at = excluded.updated_at, payload_json = excluded.payload_json
+            """,
+            (fiche_id, rcp_code, now, now, payload_json),
+        )
         # Mettre à jour la date de modification de la RCP
-        cur.execute("UPDATE rcp SET updated_at = ? WHERE code = ?", (now, rcp_code))
+        cur.execute(_SQL_TOUCH_RCP, (now, rcp_code))
+        # RCP effective de la fiche (conservée si la fiche existait déjà)
+        cur.execute(_SQL_GET_FICHE_RCP_CODE, (fiche_id,))
+        return cur.fetchone()[0]
     
-    db_write(_upsert_fiche)
+    fiche_rcp_code = db_write(_upsert_fiche)
     # Invalider le cache
-    get_all_rcp.clear()
-    load_fiches.clear()
+    invalidate_fiches_cache(rcp_code, fiche_rcp_code, fiche_id=fiche_id)
+
+
+def _flatten_payload(payload: dict, prefix: str = "") -> dict:
+    """Aplatit un payload imbriqué en colonnes 'section.clé' (comme pd.json_normalize)."""
+    flat = {}
+    for key, value in payload.items():
+        if isinstance(value, dict):
+            flat.update(_flatten_payload(value, f"{prefix}{key}."))
+        else:
+            flat[f"{prefix}{key}"] = value
+    return flat
+
+
+# Colonnes de la table fiches (hors payload_json) sélectionnables directement en SQL
+_FICHES_BASE_COLUMNS = ("id", "rcp_code", "created_at", "updated_at")
+
+
+@st.cache_resource
+def get_fiches_cache_generations() -> dict:
+    """Génération du cache des fiches par code RCP (None : toutes les fiches), partagée par le processus."""
+    return {}
+
+
+def invalidate_fiches_cache(*rcp_codes: str, fiche_id: str = None):
+    """
+    Invalide les caches après une écriture sur des fiches.
+    
+    Seules les RCP données et la vue de toutes les fiches sont rechargées : leur génération
+    change, les entrées en cache des autres RCP restent valides. Sans code RCP, tout est invalidé.
+    Avec `fiche_id`, seule cette fiche est retirée du cache de get_fiche_by_id.
+    """
+    clear_rcp_list_cache()
+    if rcp_codes:
+        generations = get_fiches_cache_generations()
+        for code in (*rcp_codes, None):
+            generations[code] = time.monotonic_ns()
+        for code in rcp_codes:
+            get_rcp.clear(code)
+    else:
+        _load_fiches_cached.clear()
+        get_rcp.clear()
+    if fiche_id is None:
+        get_fiche_by_id.clear()
+    else:
+        get_fiche_by_id.clear(fiche_id)
+
+
+def load_fiches(rcp_code: str = None, columns: tuple[str, ...] | None = None) -> pd.DataFrame:
+    """
+    Charge les fiches, optionnellement filtrées par RCP.
+    
+    Si `columns` est fourni, seules ces colonnes sont chargées : les colonnes de la table
+    sont projetées en SQL, les autres sont lues comme clés de premier niveau du payload.
+    """
+    # La génération de la RCP fait partie de la clé de cache : invalidate_fiches_cache la change
+    generation = get_fiches_cache_generations().get(rcp_code, 0)
+    return _load_fiches_cached(rcp_code, columns, generation)
 
 
 @st.cache_data(ttl=2)  # Cache pendant 2 secondes
-def load_fiches(rcp_code: str = None) -> pd.DataFrame:
-    """Charge les fiches, optionnellement filtrées par RCP."""
-    conn = get_conn()
-    try:
+def _load_fiches_cached(rcp_code: str, columns: tuple[str, ...] | None, generation: int) -> pd.DataFrame:
+    """Lecture mise en cache de load_fiches, par RCP, colonnes et génération."""
+    if columns is None:
+        select = "*"
+        payload_keys = None
+    else:
+        base_cols = [c for c in columns if c in _FICHES_BASE_COLUMNS]
+        payload_keys = [c for c in columns if c not in _FICHES_BASE_COLUMNS]
+        # Le payload n'est lu que si des clés du payload sont demandées
+        select = ", ".join(base_cols + (["payload_json"] if payload_keys else []))
+    
+    with get_pool().connection() as conn:
         if rcp_code:
-            query = "SELECT * FROM fiches WHERE rcp_code = ? ORDER BY updated_at DESC"
-            df = pd.read_sql_query(query, conn, params=(rcp_code,))
+            cur = conn.execute(f"SELECT {select} FROM fiches WHERE rcp_code = ? ORDER BY updated_at DESC", (rcp_code,))
         else:
-            query = "SELECT * FROM fiches ORDER BY updated_at DESC"
-            df = pd.read_sql_query(query, conn)
-    finally:
-        conn.close()
-    
-    if df.empty:
-        return df
-    # Parse JSON into columns (flat) - optimisé avec vectorisation
-    parsed = df["payload_json"].apply(json.loads)
-    flat = pd.json_normalize(parsed)
-    out = pd.concat([df.drop(columns=["payload_json"]), flat], axis=1)
-    return out
+            cur = conn.execute(f"SELECT {select} FROM fiches ORDER BY updated_at DESC")
+        cols = [d[0] for d in cur.description]
+    
+        # Construire directement les lignes aplaties, puis un seul DataFrame
+        records = []
+        for row in cur:
+            record = dict(zip(cols, row))
+            if payload_keys is None:
+                record.update(_flatten_payload(_json_decode(record.pop("payload_json"))))
+            elif payload_keys:
+                payload = _json_decode(record.pop("payload_json"))
+                # Clé absente du payload : colonne absente, comme sans projection
+                record.update({k: payload[k] for k in payload_keys if k in payload})
+            records.append(record)
+    
+    if not records:
+        return pd.DataFrame(columns=cols if columns is None else list(columns))
+    return pd.DataFrame.from_records(records)
 
 
+@st.cache_data(ttl=2)  # Cache pendant 2 secondes
 def get_fiche_by_id(fiche_id: str) -> dict:
-    """Récupère une fiche par son ID."""
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("SELECT rcp_code, payload_json FROM fiches WHERE id = ?", (fiche_id,))
-    res = cur.fetchone()
-    conn.close()
+    """Récupère une fiche par son ID, avec la date de sa RCP (même requête)."""
+    with get_pool().connection() as conn:
+        res = conn.execute(
+            "SELECT f.rcp_code, f.payload_json, r.date_rcp FROM fiches f LEFT JOIN rcp r ON r.code = f.rcp_code WHERE f.id = ?",
+            (fiche_id,),
+        ).fetchone()
     if res:
-        return {"rcp_code": res[0], "payload": json.loads(res[1])}
+        return {"rcp_code": res[0], "payload": _json_decode(res[1]), "rcp_date": res[2] or ''}
     return None
 
 
 def transfer_fiche(fiche_id: str, target_rcp_code: str):
     """Transfère une fiche vers une autre RCP."""
-    # Vérifications en lecture seule
-    conn = get_conn()
-    try:
-        cur = conn.cursor()
-        
+    now = datetime.now().isoformat(timespec="seconds")
+    
+    # Vérifications et écriture dans la même transaction, avec retry
+    def _transfer_fiche(conn, cur):
         # Récupérer le code RCP actuel
-        cur.execute("SELECT rcp_code FROM fiches WHERE id = ?", (fiche_id,))
+        cur.execute(_SQL_GET_FICHE_RCP_CODE, (fiche_id,))
         res = cur.fetchone()
         if not res:
-            return False
+            return None
         
         source_rcp_code = res[0]
         
         # Vérifier que la RCP cible existe
-        cur.execute("SELECT code FROM rcp WHERE code = ?", (target_rcp_code,))
+        cur.execute(_SQL_RCP_EXISTS, (target_rcp_code,))
         if cur.fetchone() is None:
-            return False
-    finally:
-        conn.close()
-    
-    # Écriture avec retry
-    now = datetime.now().isoformat(timespec="seconds")
-    
-    def _transfer_fiche(conn, cur):
+            return None
+        
         # Transférer la fiche
         cur.execute("UPDATE fiches SET rcp_code = ?, updated_at = ? WHERE id = ?", (target_rcp_code, now, fiche_id))
         
-        # Mettre à jour les dates de modification des deux RCP
-        cur.execute("UPDATE rcp SET updated_at = ? WHERE code = ?", (now, source_rcp_code))
-        cur.execute("UPDATE rcp SET updated_at = ? WHERE code = ?", (now, target_rcp_code))
+        # Mettre à jour les dates de modification des deux RCP en une seule instruction
+        cur.execute("UPDATE rcp SET updated_at = ? WHERE code IN (?, ?)", (now, source_rcp_code, target_rcp_code))
+        return source_rcp_code
     
-    db_write(_transfer_fiche)
-    # Invalider le cache
-    get_all_rcp.clear()
-    load_fiches.clear()
+    source_rcp_code = db_write(_transfer_fiche)
+    if source_rcp_code is None:
+        return False
+    # Invalider le cache des deux RCP
+    invalidate_fiches_cache(source_rcp_code, target_rcp_code, fiche_id=fiche_id)
     return True
 
 
 def delete_fiche(fiche_id: str):
     """Supprime une fiche et met à jour la date de modification de la RCP."""
-    # Récupérer le code RCP avant suppression (lecture seule)
-    conn = get_conn()
-    try:
-        cur = conn.cursor()
-        cur.execute("SELECT rcp_code FROM fiches WHERE id = ?", (fiche_id,))
-        res = cur.fetchone()
-        rcp_code = res[0] if res else None
-    finally:
-        conn.close()
-    
     # Écriture avec retry
     def _delete_fiche(conn, cur):
+        # Récupérer le code RCP avant suppression, dans la même transaction
+        cur.execute(_SQL_GET_FICHE_RCP_CODE, (fiche_id,))
+        res = cur.fetchone()
+        rcp_code = res[0] if res else None
+        
         cur.execute("DELETE FROM fiches WHERE id = ?", (fiche_id,))
         
         # Mettre à jour la date de modification de la RCP
         if rcp_code:
             now = datetime.now().isoformat(timespec="seconds")
-            cur.execute("UPDATE rcp SET updated_at = ? WHERE code = ?", (now, rcp_code))
+            cur.execute(_SQL_TOUCH_RCP, (now, rcp_code))
+        return rcp_code
     
-    db_write(_delete_fiche)
+    rcp_code = db_write(_delete_fiche)
     # Invalider le cache
-    get_all_rcp.clear()
-    load_fiches.clear()
+    if rcp_code:
+        invalidate_fiches_cache(rcp_code, fiche_id=fiche_id)
 
 
 # ---------------------------
 # PDF generation
 # ---------------------------
-def generate_pdf_fiche(fiche_id: str, payload: dict, rcp_code: str = None) -> str:
-    """Génère un PDF amélioré pour une seule fiche."""
+# Styles ReportLab construits une seule fois à l'import et partagés par tous les PDF
+_PDF_BASE_STYLES = getSampleStyleSheet()
+
+# Style personnalisé pour le titre
+_PDF_TITLE_STYLE = ParagraphStyle(
+    'CustomTitle',
+    parent=_PDF_BASE_STYLES['Heading1'],
+    fontSize=16,
+    textColor=colors.HexColor('#1f4788'),
+    spaceAfter=30,
+    alignment=TA_CENTER
+)
+
+# Style pour la date (même style que le titre mais sans espacement après)
+_PDF_DATE_STYLE = ParagraphStyle(
+    'DateStyle',
+    parent=_PDF_TITLE_STYLE,
+    spaceAfter=20,
+)
+
+# Style pour les sections
+_PDF_SECTION_STYLE = ParagraphStyle(
+    'Section',
+    parent=_PDF_BASE_STYLES['Heading2'],
+    fontSize=12,
+    textColor=colors.HexColor('#2c3e50'),
+    spaceAfter=12,
+    spaceBefore=12,
+    borderColor=colors.HexColor('#3498db'),
+    borderWidth=1,
+    borderPadding=5,
+    backColor=colors.HexColor('#ecf0f1')
+)
+
+# Style pour les médecins présents
+_PDF_MEDECINS_STYLE = ParagraphStyle(
+    'MedecinsStyle',
+    parent=_PDF_BASE_STYLES['Normal'],
+    fontSize=11,
+    textColor=colors.HexColor('#2c3e50'),
+    spaceAfter=15,
+    alignment=TA_CENTER,
+    leading=14
+)
+
+# Style pour les cellules du tableau (permet le wrapping du texte)
+_PDF_CELL_KEY_STYLE = ParagraphStyle(
+    'CellKey',
+    parent=_PDF_BASE_STYLES['Normal'],
+    fontSize=10,
+    fontName='Helvetica-Bold',
+    textColor=colors.black,
+    leading=12,
+    spaceAfter=0,
+    spaceBefore=0,
+)
+_PDF_CELL_VALUE_STYLE = ParagraphStyle(
+    'CellValue',
+    parent=_PDF_BASE_STYLES['Normal'],
+    fontSize=10,
+    fontName='Helvetica',
+    textColor=colors.black,
+    leading=12,
+    spaceAfter=0,
+    spaceBefore=0,
+)
+
+# Tableaux des sections : largeurs des colonnes (clé / valeur) et style partagé
+_PDF_TABLE_COL_WIDTHS = (6*cm, 10*cm)
+_PDF_TABLE_PADDING = 6
+_PDF_TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#f8f9fa')),
+    ('TEXTCOLOR', (0, 0), (0, -1), colors.black),
+    ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, -1), 10),
+    ('FONTNAME', (1, 0), (1, -1), 'Helvetica'),
+    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+    ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+    ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#dee2e6')),
+    ('ROWBACKGROUNDS', (0, 0), (-1, -1), [colors.white, colors.HexColor('#f8f9fa')]),
+    ('LEFTPADDING', (0, 0), (-1, -1), _PDF_TABLE_PADDING),
+    ('RIGHTPADDING', (0, 0), (-1, -1), _PDF_TABLE_PADDING),
+    ('TOPPADDING', (0, 0), (-1, -1), 4),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 4),
+    ('WORDWRAP', (0, 0), (-1, -1), True),  # Activer le word wrap
+])
+
+_PDF_EXAMENS_IMAGERIE_STYLE = ParagraphStyle(
+    'ExamensImagerie',
+    parent=_PDF_BASE_STYLES['Normal'],
+    fontSize=10,
+    spaceAfter=12,
+    leftIndent=0,
+    rightIndent=0,
+)
+
+_PDF_PROPOSITION_STYLE = ParagraphStyle(
+    'Proposition',
+    parent=_PDF_BASE_STYLES['Normal'],
+    fontSize=10,
+    leading=14,
+    spaceAfter=12,
+    leftIndent=0.5*cm,
+    rightIndent=0.5*cm,
+)
+
+
+def _pdf_cell(text: str, style: ParagraphStyle, col_width: float):
+    """
+    Retourne le contenu d'une cellule de tableau pour le PDF.
+    
+    Le texte brut est dessiné directement par la Table, sans analyse XML, mais n'est jamais
+    renvoyé à la ligne : un Paragraph n'est créé que pour le texte multi-ligne, contenant
+    du balisage, ou trop large pour la colonne.
+    """
+    if ('\n' in text or '<' in text or '&' in text
+            or stringWidth(text, style.fontName, style.fontSize) > col_width - 2 * _PDF_TABLE_PADDING):
+        return Paragraph(text.replace('\n', '<br/>'), style)
+    return text
+
+
+def generate_pdf_fiche(fiche_id: str, payload: dict, rcp_code: str = None, medecins_presents: str = None) -> str:
+    """
+    Génère un PDF amélioré pour une seule fiche.
+    
+    Si medecins_presents n'est pas fourni, la liste est lue depuis la RCP rcp_code.
+    """
     
     ts = datetime.now().strftime("%Y%m%d_%H%M%S")
     patiente_nom = payload.get("patiente_nom", "Non renseigné")
@@ -474,137 +786,53 @@ def generate_pdf_fiche(fiche_id: str, payload: dict, rcp_code: str = None) -> st
                            rightMargin=2*cm, leftMargin=2*cm,
                            topMargin=2*cm, bottomMargin=2*cm)
     story = []
-    styles = getSampleStyleSheet()
-    
-    # Style personnalisé pour le titre
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=16,
-        textColor=colors.HexColor('#1f4788'),
-        spaceAfter=30,
-        alignment=TA_CENTER
-    )
-    
-    # Style pour les sections
-    section_style = ParagraphStyle(
-        'Section',
-        parent=styles['Heading2'],
-        fontSize=12,
-        textColor=colors.HexColor('#2c3e50'),
-        spaceAfter=12,
-        spaceBefore=12,
-        borderColor=colors.HexColor('#3498db'),
-        borderWidth=1,
-        borderPadding=5,
-        backColor=colors.HexColor('#ecf0f1')
-    )
     
     # Titre principal
-    story.append(Paragraph("RCP de pelvi-périnéologie", title_style))
+    story.append(Paragraph("RCP de pelvi-périnéologie", _PDF_TITLE_STYLE))
     
     # Date de la RCP juste en dessous du titre (même police)
     rcp_date = payload.get("rcp_date", "")
     if rcp_date and rcp_date != "None":
         try:
-            date_obj = datetime.strptime(rcp_date, "%Y-%m-%d")
-            mois_fr = [
-                "janvier", "février", "mars", "avril", "mai", "juin",
-                "juillet", "août", "septembre", "octobre", "novembre", "décembre"
-            ]
-            jour = date_obj.day
-            mois = mois_fr[date_obj.month - 1]
-            annee = date_obj.year
-            date_formatted = f"{jour} {mois} {annee}"
-        except:
+            date_obj = date.fromisoformat(rcp_date)
+            date_formatted = f"{date_obj.day} {_MOIS_FR[date_obj.month - 1]} {date_obj.year}"
+        except ValueError:
             date_formatted = rcp_date
     else:
         date_formatted = "Date non renseignée"
     
-    # Style pour la date (même style que le titre mais sans espacement après)
-    date_style = ParagraphStyle(
-        'DateStyle',
-        parent=title_style,
-        spaceAfter=20,
-    )
-    story.append(Paragraph(date_formatted, date_style))
+    story.append(Paragraph(date_formatted, _PDF_DATE_STYLE))
     story.append(Spacer(1, 0.8*cm))
     
     # Liste des médecins présents (avant la section Identité)
-    if rcp_code:
+    if medecins_presents is None and rcp_code:
         medecins_presents = get_rcp_medecins_presents(rcp_code)
-        if medecins_presents and medecins_presents.strip():
-            # Style pour les médecins présents
-            medecins_style = ParagraphStyle(
-                'MedecinsStyle',
-                parent=styles['Normal'],
-                fontSize=11,
-                textColor=colors.HexColor('#2c3e50'),
-                spaceAfter=15,
-                alignment=TA_CENTER,
-                leading=14
-            )
-            story.append(Paragraph("Médecins présents", medecins_style))
-            # Afficher la liste des médecins (gérer les retours à la ligne et les virgules)
-            medecins_list = medecins_presents.replace('\n', ', ').replace(',,', ',').strip()
-            if medecins_list:
-                medecins_paragraph = Paragraph(medecins_list, medecins_style)
-                story.append(medecins_paragraph)
-            story.append(Spacer(1, 0.5*cm))
+    if medecins_presents and medecins_presents.strip():
+        story.append(Paragraph("Médecins présents", _PDF_MEDECINS_STYLE))
+        # Afficher la liste des médecins (gérer les retours à la ligne et les virgules)
+        medecins_list = medecins_presents.replace('\n', ', ').replace(',,', ',').strip()
+        if medecins_list:
+            medecins_paragraph = Paragraph(medecins_list, _PDF_MEDECINS_STYLE)
+            story.append(medecins_paragraph)
+        story.append(Spacer(1, 0.5*cm))
     
     def add_section(title, data_dict):
         """Ajoute une section au PDF."""
-        story.append(Paragraph(title, section_style))
-        
-        # Style pour les cellules du tableau (permet le wrapping du texte)
-        cell_style_key = ParagraphStyle(
-            'CellKey',
-            parent=styles['Normal'],
-            fontSize=10,
-            fontName='Helvetica-Bold',
-            textColor=colors.black,
-            leading=12,
-            spaceAfter=0,
-            spaceBefore=0,
-        )
-        cell_style_value = ParagraphStyle(
-            'CellValue',
-            parent=styles['Normal'],
-            fontSize=10,
-            fontName='Helvetica',
-            textColor=colors.black,
-            leading=12,
-            spaceAfter=0,
-            spaceBefore=0,
-        )
+        story.append(Paragraph(title, _PDF_SECTION_STYLE))
         
-        # Créer un tableau pour les données avec Paragraph pour le wrapping
+        # Créer un tableau pour les données (Paragraph seulement si le texte doit être renvoyé à la ligne)
+        key_width, value_width = _PDF_TABLE_COL_WIDTHS
         table_data = []
         for key, value in data_dict.items():
             if value and str(value).strip() and str(value) != "None":
-                # Utiliser Paragraph pour permettre le wrapping du texte
-                key_para = Paragraph(str(key).replace('\n', '<br/>'), cell_style_key)
-                value_para = Paragraph(str(value).replace('\n', '<br/>'), cell_style_value)
-                table_data.append([key_para, value_para])
+                table_data.append([
+                    _pdf_cell(str(key), _PDF_CELL_KEY_STYLE, key_width),
+                    _pdf_cell(str(value), _PDF_CELL_VALUE_STYLE, value_width),
+                ])
         
         if table_data:
-            data_table = Table(table_data, colWidths=[6*cm, 10*cm])
-            data_table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#f8f9fa')),
-                ('TEXTCOLOR', (0, 0), (0, -1), colors.black),
-                ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, -1), 10),
-                ('FONTNAME', (1, 0), (1, -1), 'Helvetica'),
-                ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-                ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-                ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#dee2e6')),
-                ('ROWBACKGROUNDS', (0, 0), (-1, -1), [colors.white, colors.HexColor('#f8f9fa')]),
-                ('LEFTPADDING', (0, 0), (-1, -1), 6),
-                ('RIGHTPADDING', (0, 0), (-1, -1), 6),
-                ('TOPPADDING', (0, 0), (-1, -1), 4),
-                ('BOTTOMPADDING', (0, 0), (-1, -1), 4),
-                ('WORDWRAP', (0, 0), (-1, -1), True),  # Activer le word wrap
-            ]))
+            data_table = Table(table_data, colWidths=list(_PDF_TABLE_COL_WIDTHS))
+            data_table.setStyle(_PDF_TABLE_STYLE)
             story.append(data_table)
             story.append(Spacer(1, 0.5*cm))
     
@@ -642,7 +870,7 @@ def generate_pdf_fiche(fiche_id: str, payload: dict, rcp_code: str = None) -> st
     # On peut passer un dictionnaire vide ou ne pas appeler add_section
     if anthropo_title != "Anthropométrie":
         # Afficher juste le titre sans tableau
-        story.append(Paragraph(anthropo_title, section_style))
+        story.append(Paragraph(anthropo_title, _PDF_SECTION_STYLE))
         story.append(Spacer(1, 0.5*cm))
     
     # Section Antécédents
@@ -686,57 +914,63 @@ def generate_pdf_fiche(fiche_id: str, payload: dict, rcp_code: str = None) -> st
     # Section Examens d'imagerie
     examens_imagerie = payload.get("examens_imagerie", "")
     if examens_imagerie and examens_imagerie.strip():
-        story.append(Paragraph("Examens d'imagerie", section_style))
-        examens_imagerie_style = ParagraphStyle(
-            'ExamensImagerie',
-            parent=styles['Normal'],
-            fontSize=10,
-            spaceAfter=12,
-            leftIndent=0,
-            rightIndent=0,
-        )
-        story.append(Paragraph(examens_imagerie.strip(), examens_imagerie_style))
+        story.append(Paragraph("Examens d'imagerie", _PDF_SECTION_STYLE))
+        story.append(Paragraph(examens_imagerie.strip(), _PDF_EXAMENS_IMAGERIE_STYLE))
         story.append(Spacer(1, 0.5*cm))
     
     # Section Proposition RCP
     prop = payload.get("proposition_rcp", "")
     if prop and prop.strip():
-        story.append(Paragraph("Proposition de la RCP", section_style))
-        prop_style = ParagraphStyle(
-            'Proposition',
-            parent=styles['Normal'],
-            fontSize=10,
-            leading=14,
-            spaceAfter=12,
-            leftIndent=0.5*cm,
-            rightIndent=0.5*cm,
-        )
-        story.append(Paragraph(prop.replace('\n', '<br/>'), prop_style))
+        story.append(Paragraph("Proposition de la RCP", _PDF_SECTION_STYLE))
+        story.append(Paragraph(prop.replace('\n', '<br/>'), _PDF_PROPOSITION_STYLE))
     
     doc.build(story)
     return out_path
 
 
-def generate_pdf_rcp(rcp_code: str) -> list:
-    """Génère un PDF pour chaque fiche de la RCP et retourne la liste des chemins."""
-    # Charger toutes les fiches de la RCP
-    df_fiches = load_fiches(rcp_code)
-    if df_fiches.empty:
+def _payload_hash(payload: dict) -> str:
+    """Empreinte stable d'un payload (clés triées), utilisée comme clé de cache."""
+    return hashlib.blake2b(orjson.dumps(payload, option=orjson.OPT_SORT_KEYS), digest_size=16).hexdigest()
+
+
+@st.cache_data(show_spinner=False, max_entries=256)
+def _generate_pdf_fiche_cached(fiche_id: str, rcp_code: str, payload_hash: str, medecins_presents: str, _payload: dict) -> str:
+    """Génération mise en cache par fiche, empreinte du payload et médecins présents (_payload n'est pas haché)."""
+    return generate_pdf_fiche(fiche_id, _payload, rcp_code, medecins_presents)
+
+
+def get_pdf_fiche(fiche_id: str, payload: dict, rcp_code: str) -> str:
+    """Retourne le PDF d'une fiche, régénéré seulement si son contenu a changé ou si le fichier a disparu."""
+    key = (fiche_id, rcp_code, _payload_hash(payload), get_rcp_medecins_presents(rcp_code))
+    pdf_path = _generate_pdf_fiche_cached(*key, payload)
+    if not os.path.exists(pdf_path):
+        _generate_pdf_fiche_cached.clear(*key, payload)
+        pdf_path = _generate_pdf_fiche_cached(*key, payload)
+    return pdf_path
+
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def _read_pdf_bytes(pdf_path: str, mtime: float) -> bytes:
+    """Contenu d'un PDF généré, mis en cache par chemin et date de modification."""
+    with open(pdf_path, "rb") as f:
+        return f.read()
+
+
+def generate_pdf_rcp(rcp_code: str) -> Iterator[str]:
+    """Génère un PDF pour chaque fiche de la RCP et produit les chemins au fur et à mesure."""
+    # Une seule requête : pas besoin du DataFrame aplati de load_fiches ici
+    with get_pool().connection() as conn:
+        rows = conn.execute("SELECT id, payload_json FROM fiches WHERE rcp_code = ? ORDER BY created_at", (rcp_code,)).fetchall()
+    if not rows:
         raise ValueError(f"Aucune fiche trouvée pour la RCP {rcp_code}")
     
-    # Récupérer les données JSON complètes
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("SELECT id, payload_json FROM fiches WHERE rcp_code = ? ORDER BY created_at", (rcp_code,))
-    fiches_data = [(row[0], json.loads(row[1])) for row in cur.fetchall()]
-    conn.close()
-    
-    pdf_paths = []
-    for fiche_id, payload in fiches_data:
-        pdf_path = generate_pdf_fiche(fiche_id, payload, rcp_code)
-        pdf_paths.append(pdf_path)
-    
-    return pdf_paths
+    # Liste des médecins lue une seule fois pour toute la RCP
+    medecins_presents = get_rcp_medecins_presents(rcp_code)
+    for i, (fiche_id, payload_json) in enumerate(rows, start=1):
+        yield generate_pdf_fiche(fiche_id, _json_decode(payload_json), rcp_code, medecins_presents)
+        # Les documents ReportLab forment des cycles de références : les libérer régulièrement
+        if i % PDF_GC_INTERVAL == 0:
+            gc.collect()
 
 
 # ---------------------------
@@ -744,54 +978,63 @@ def generate_pdf_rcp(rcp_code: str) -> list:
 # ---------------------------
 def export_rcp_to_csv(rcp_code: str) -> str:
     """Exporte une RCP et ses fiches en CSV pour synchronisation."""
-    conn = get_conn()
-    try:
-        # Export RCP
-        df_rcp = pd.read_sql_query("SELECT * FROM rcp WHERE code = ?", conn, params=(rcp_code,))
-        
-        # Export fiches de cette RCP
-        df_fiches = pd.read_sql_query("SELECT * FROM fiches WHERE rcp_code = ? ORDER BY updated_at DESC", conn, params=(rcp_code,))
-    finally:
-        conn.close()
-    
-    if df_fiches.empty and df_rcp.empty:
-        return None
-    
-    # Créer un DataFrame unifié pour l'export - optimisé avec apply au lieu de iterrows
-    export_data = []
-    
-    # Pour chaque fiche, ajouter les infos RCP - optimisé
-    if not df_fiches.empty:
-        payloads = df_fiches["payload_json"].apply(json.loads)
-        for idx in df_fiches.index:
-            fiche_row = df_fiches.loc[idx]
-            payload = payloads.loc[idx]
-            row = {
-                "type": "fiche",
-                "id": fiche_row["id"],
-                "rcp_code": fiche_row["rcp_code"],
-                "created_at": fiche_row["created_at"],
-                "updated_at": fiche_row["updated_at"],
-                **payload
-            }
-            export_data.append(row)
-    
-    # Pour la RCP, ajouter une entrée
-    if not df_rcp.empty:
-        rcp_row = df_rcp.iloc[0]
-        row = {
-            "type": "rcp",
-            "code": rcp_row["code"],
-            "date_rcp": rcp_row.get("date_rcp", ""),
-            "created_at": rcp_row["created_at"],
-            "updated_at": rcp_row["updated_at"]
-        }
-        export_data.append(row)
-    
-    df_export = pd.DataFrame(export_data)
-    ts = datetime.now().strftime("%Y%m%d_%H%M%S")
-    out_csv = os.path.join(CSV_DIR, f"export_rcp_{rcp_code}_{ts}.csv")
-    df_export.to_csv(out_csv, index=False, encoding="utf-8")
+    with get_pool().connection() as conn:
+        # Une seule transaction de lecture : l'union des colonnes et les lignes écrites viennent du
+        # même instantané, même si une fiche est enregistrée entre les deux passages
+        conn.execute("BEGIN")
+        try:
+            # Export RCP
+            rcp_row = conn.execute(
+                "SELECT code, date_rcp, created_at, updated_at FROM rcp WHERE code = ?", (rcp_code,)
+            ).fetchone()
+    
+            # Export fiches de cette RCP (lues en flux, sans DataFrame intermédiaire)
+            fiches_query = "SELECT id, rcp_code, created_at, updated_at, payload_json FROM fiches WHERE rcp_code = ? ORDER BY updated_at DESC"
+    
+            # Premier passage : union des colonnes dans leur ordre d'apparition
+            fieldnames = {}
+            nb_fiches = 0
+            for row in conn.execute(fiches_query, (rcp_code,)):
+                if not nb_fiches:
+                    fieldnames.update(dict.fromkeys(["type", "id", "rcp_code", "created_at", "updated_at"]))
+                fieldnames.update(dict.fromkeys(_json_decode(row[4])))
+                nb_fiches += 1
+            if rcp_row is not None:
+                fieldnames.update(dict.fromkeys(["type", "code", "date_rcp", "created_at", "updated_at"]))
+    
+            if not nb_fiches and rcp_row is None:
+                return None
+    
+            ts = datetime.now().strftime("%Y%m%d_%H%M%S")
+            out_csv = os.path.join(CSV_DIR, f"export_rcp_{rcp_code}_{ts}.csv")
+            with open(out_csv, "w", newline="", encoding="utf-8") as f:
+                # Fins de ligne de la plateforme, comme DataFrame.to_csv (CRLF sous Windows)
+                writer = csv.DictWriter(f, fieldnames=list(fieldnames), lineterminator=os.linesep)
+                writer.writeheader()
+        
+                # Second passage : une ligne par fiche, écrite directement sur disque
+                for fiche_id, fiche_rcp_code, created_at, updated_at, payload_json in conn.execute(fiches_query, (rcp_code,)):
+                    writer.writerow({
+                        "type": "fiche",
+                        "id": fiche_id,
+                        "rcp_code": fiche_rcp_code,
+                        "created_at": created_at,
+                        "updated_at": updated_at,
+                        **_json_decode(payload_json)
+                    })
+        
+                # Pour la RCP, ajouter une entrée
+                if rcp_row is not None:
+                    writer.writerow({
+                        "type": "rcp",
+                        "code": rcp_row[0],
+                        "date_rcp": rcp_row[1],
+                        "created_at": rcp_row[2],
+                        "updated_at": rcp_row[3]
+                    })
+        finally:
+            if conn.in_transaction:
+                conn.execute("COMMIT")
     return out_csv
 
 
@@ -804,14 +1047,10 @@ def import_rcp_from_csv(uploaded_file, target_rcp_code: str) -> dict:
             return {"success": False, "message": "Le fichier CSV est vide."}
         
         # Vérifier que la RCP cible existe (lecture seule)
-        conn = get_conn()
-        try:
-            cur = conn.cursor()
-            cur.execute("SELECT code FROM rcp WHERE code = ?", (target_rcp_code,))
-            if cur.fetchone() is None:
-                return {"success": False, "message": f"La RCP {target_rcp_code} n'existe pas."}
-        finally:
-            conn.close()
+        with get_pool().connection() as conn:
+            rcp_exists = conn.execute(_SQL_RCP_EXISTS, (target_rcp_code,)).fetchone() is not None
+        if not rcp_exists:
+            return {"success": False, "message": f"La RCP {target_rcp_code} n'existe pas."}
         
         imported_fiches = 0
         updated_fiches = 0
@@ -825,158 +1064,183 @@ def import_rcp_from_csv(uploaded_file, target_rcp_code: str) -> dict:
             fiche_rows = df
         
         # Grouper par ID et garder seulement la fiche la plus récente pour chaque ID
+        updated_at_canonical = None
         if not fiche_rows.empty and "id" in fiche_rows.columns:
-            # Convertir updated_at en datetime pour comparaison
-            fiche_rows = fiche_rows.copy()
-            fiche_rows["updated_at_parsed"] = pd.to_datetime(
+            # Convertir updated_at en datetime en une passe (ISO 8601, fuseaux ramenés en UTC)
+            updated_at_parsed = pd.to_datetime(
                 fiche_rows["updated_at"], 
                 errors="coerce", 
-                format="%Y-%m-%dT%H:%M:%S"
+                format="ISO8601",
+                utc=True
             )
-            # Trier par ID et updated_at décroissant, puis garder le premier de chaque groupe
-            fiche_rows = fiche_rows.sort_values(["id", "updated_at_parsed"], ascending=[True, False])
-            fiche_rows = fiche_rows.drop_duplicates(subset=["id"], keep="first")
-            fiche_rows = fiche_rows.drop(columns=["updated_at_parsed"])
-        
-        skipped_older = 0
+            # Ligne la plus récente de chaque ID, en une passe et sans tri. Une date illisible (NaT)
+            # passe après toutes les autres ; à égalité, la première ligne du fichier l'emporte
+            latest = updated_at_parsed.fillna(pd.Timestamp.min.tz_localize("UTC")).groupby(fiche_rows["id"]).idxmax()
+            fiche_rows = fiche_rows.loc[latest]
+            # Dates enregistrées sous une forme ISO canonique à la seconde, en heure locale sans fuseau
+            # comme le reste de l'application ; NaN si illisible. Sans décalage, l'heure lue est gardée
+            # telle quelle ; avec un décalage (Z, +02:00), elle est convertie en heure locale
+            latest_parsed = updated_at_parsed.loc[latest]
+            canonical = latest_parsed.dt.strftime("%Y-%m-%dT%H:%M:%S")
+            has_offset = fiche_rows["updated_at"].astype(str).str.contains(r"(?:[Zz]|[+-]\d{2}:?\d{2})$")
+            for label in has_offset.index[has_offset.to_numpy() & latest_parsed.notna().to_numpy()]:
+                canonical[label] = latest_parsed[label].to_pydatetime().astimezone().strftime("%Y-%m-%dT%H:%M:%S")
+            updated_at_canonical = canonical.to_numpy()
         
-        # Récupérer toutes les fiches existantes en une seule requête pour optimiser (lecture seule)
-        existing_fiches = {}
-        if not fiche_rows.empty and "id" in fiche_rows.columns:
-            fiche_ids = [str(fid) for fid in fiche_rows["id"].dropna().unique()]
-            if fiche_ids:
-                conn = get_conn()
-                try:
-                    cur = conn.cursor()
-                    placeholders = ','.join(['?'] * len(fiche_ids))
-                    cur.execute(f"SELECT id, updated_at FROM fiches WHERE id IN ({placeholders})", fiche_ids)
-                    for row in cur.fetchall():
-                        existing_fiches[row[0]] = row[1]
-                finally:
-                    conn.close()
-        
-        # Traiter les fiches par batch
-        batch_size = 50
         now = datetime.now().isoformat(timespec="seconds")
         
-        # Préparer les données de toutes les fiches
-        fiche_operations = []
+        # Extraire une fois chaque colonne utile en tableau : la boucle accède ensuite par indice,
+        # sans construire de Series par ligne. Les valeurs renseignées sont repérées par des
+        # masques booléens calculés en une passe par colonne
+        def _column(name):
+            return fiche_rows[name].to_numpy() if name in fiche_rows.columns else None
+        
+        def _column_with_mask(name):
+            col = fiche_rows[name]
+            return col.to_numpy(), col.notna().to_numpy()
         
-        for _, row in fiche_rows.iterrows():
+        def _parse_json_cell(value):
+            try:
+                return _json_decode(str(value))
+            except json.JSONDecodeError:
+                return {}
+        
+        # Colonnes JSON "antecedents" / "examen" décodées en une passe (cellule illisible : {})
+        def _json_column_with_mask(name):
+            if name not in fiche_rows.columns:
+                return None, None
+            col = fiche_rows[name]
+            return col.map(_parse_json_cell, na_action="ignore").to_numpy(), col.notna().to_numpy()
+        
+        payload_fields = [
+            "rcp_date", "chirurgien",
+            "patiente_nom", "patiente_ddn", "poids_kg", "taille_cm", "imc",
+            "iu_type", "severite_protections_j", "gene_10", "score_usp", "score_hav", "dysurie",
+            "qmax_ml_s", "volume_urine_ml", "rpm_ml", "courbe_normale", "proposition_rcp"
+        ]
+        field_arrays = [(field, *_column_with_mask(field)) for field in payload_fields if field in fiche_rows.columns]
+        ids = _column("id")
+        created_ats = _column("created_at")
+        updated_ats = _column("updated_at")
+        antecedents_parsed, antecedents_valid = _json_column_with_mask("antecedents")
+        examen_parsed, examen_valid = _json_column_with_mask("examen")
+        # Colonnes aplaties "antecedents.x" / "examen.x" : clé sans préfixe calculée une seule fois
+        antec_map = [(col[len("antecedents."):], *_column_with_mask(col)) for col in fiche_rows.columns if col.startswith("antecedents.")]
+        exam_map = [(col[len("examen."):], *_column_with_mask(col)) for col in fiche_rows.columns if col.startswith("examen.")]
+        
+        # Préparer les paramètres de toutes les fiches
+        fiche_params = []
+        
+        for i in range(len(ids) if ids is not None else 0):
             try:
-                fiche_id = row.get("id")
-                if pd.isna(fiche_id):
+                fiche_id = ids[i]
+                if fiche_id != fiche_id:
                     continue
                 
                 fiche_id = str(fiche_id)
                 rcp_code = target_rcp_code
                 
                 # Reconstruire le payload depuis les colonnes
-                payload = {}
-                payload_fields = [
-                    "rcp_date", "chirurgien",
-                    "patiente_nom", "patiente_ddn", "poids_kg", "taille_cm", "imc",
-                    "iu_type", "severite_protections_j", "gene_10", "score_usp", "score_hav", "dysurie",
-                    "qmax_ml_s", "volume_urine_ml", "rpm_ml", "courbe_normale", "proposition_rcp"
-                ]
-                
-                for field in payload_fields:
-                    if field in row and not pd.isna(row[field]):
-                        payload[field] = str(row[field])
+                payload = {field: str(values[i]) for field, values, valid in field_arrays if valid[i]}
                 
                 # Antécédents
-                if "antecedents" in row and not pd.isna(row["antecedents"]):
-                    try:
-                        payload["antecedents"] = json.loads(str(row["antecedents"]))
-                    except:
-                        payload["antecedents"] = {}
+                if antecedents_valid is not None and antecedents_valid[i]:
+                    payload["antecedents"] = antecedents_parsed[i]
                 else:
                     antecedents = {}
-                    for col in df.columns:
-                        if col.startswith("antecedents."):
-                            key = col.replace("antecedents.", "")
-                            if not pd.isna(row[col]):
-                                antecedents[key] = str(row[col])
+                    for key, values, valid in antec_map:
+                        if valid[i]:
+                            antecedents[key] = str(values[i])
                     payload["antecedents"] = antecedents if antecedents else {}
                 
                 # Examen
-                if "examen" in row and not pd.isna(row["examen"]):
-                    try:
-                        payload["examen"] = json.loads(str(row["examen"]))
-                    except:
-                        payload["examen"] = {}
+                if examen_valid is not None and examen_valid[i]:
+                    payload["examen"] = examen_parsed[i]
                 else:
                     examen = {}
-                    for col in df.columns:
-                        if col.startswith("examen."):
-                            key = col.replace("examen.", "")
-                            if not pd.isna(row[col]):
-                                examen[key] = str(row[col])
+                    for key, values, valid in exam_map:
+                        if valid[i]:
+                            examen[key] = str(values[i])
                     payload["examen"] = examen if examen else {}
                 
-                created_at = row.get("created_at", now)
-                updated_at = row.get("updated_at", now)
-                
-                # Vérifier si la fiche existe
-                existing_updated_at = existing_fiches.get(fiche_id)
-                
-                operation = None
-                if existing_updated_at:
-                    # Comparer les dates (format ISO)
-                    try:
-                        existing_date = datetime.fromisoformat(existing_updated_at.replace("Z", "+00:00") if "Z" in existing_updated_at else existing_updated_at)
-                        new_date = datetime.fromisoformat(updated_at.replace("Z", "+00:00") if "Z" in updated_at else updated_at)
-                        
-                        # Ne mettre à jour que si la nouvelle date est plus récente
-                        if new_date > existing_date:
-                            operation = ("update", fiche_id, rcp_code, updated_at, payload)
-                        else:
-                            skipped_older += 1
-                    except Exception:
-                        # En cas d'erreur de parsing de date, mettre à jour quand même
-                        operation = ("update", fiche_id, rcp_code, updated_at, payload)
+                created_at = created_ats[i] if created_ats is not None else now
+                if updated_ats is None:
+                    updated_at = now
+                elif updated_at_canonical is not None and updated_at_canonical[i] == updated_at_canonical[i]:
+                    updated_at = updated_at_canonical[i]
                 else:
-                    operation = ("insert", fiche_id, rcp_code, created_at, updated_at, payload)
+                    # Date illisible : conservée telle quelle (la fiche existante sera mise à jour)
+                    updated_at = updated_ats[i]
+                # Sérialisation ici, hors du verrou d'écriture
+                payload_json = _json_encode(payload)
                 
-                if operation:
-                    fiche_operations.append(operation)
+                fiche_params.append((fiche_id, rcp_code, created_at, updated_at, payload_json))
                     
             except Exception as e:
-                errors.append(f"Erreur fiche {row.get('id', 'unknown')}: {str(e)}")
+                errors.append(f"Erreur fiche {ids[i]}: {str(e)}")
         
-        # Traiter les opérations par batch avec db_write
-        for i in range(0, len(fiche_operations), batch_size):
-            batch = fiche_operations[i:i+batch_size]
+        # Décision insertion / mise à jour sur les dates analysées, dans la transaction d'écriture :
+        # une fiche existante n'est remplacée que si la version importée est plus récente, ou si
+        # l'une des deux dates est illisible (mise à jour quand même, comme avant)
+        skipped_older = 0
+        if fiche_params:
+            fiche_ids = [params[0] for params in fiche_params]
+            new_updated_at = pd.to_datetime(
+                pd.Series([params[3] for params in fiche_params], dtype=object),
+                errors="coerce", format="ISO8601", utc=True
+            )
             
-            def _process_batch(conn, cur):
-                nonlocal imported_fiches, updated_fiches
-                for op in batch:
-                    if op[0] == "update":
-                        _, fiche_id, rcp_code, updated_at, payload = op
-                        cur.execute(
-                            "UPDATE fiches SET rcp_code = ?, updated_at = ?, payload_json = ? WHERE id = ?",
-                            (rcp_code, updated_at, json.dumps(payload, ensure_ascii=False), fiche_id)
-                        )
-                        updated_fiches += 1
-                    elif op[0] == "insert":
-                        _, fiche_id, rcp_code, created_at, updated_at, payload = op
-                        cur.execute(
-                            "INSERT INTO fiches (id, rcp_code, created_at, updated_at, payload_json) VALUES (?, ?, ?, ?, ?)",
-                            (fiche_id, rcp_code, created_at, updated_at, json.dumps(payload, ensure_ascii=False))
-                        )
-                        imported_fiches += 1
+            def _process_fiches(conn, cur):
+                # Cache de pages agrandi (64 Mo) le temps de l'import, puis valeur d'origine restaurée
+                cur.execute("PRAGMA cache_size")
+                cache_size = cur.fetchone()[0]
+                cur.execute("PRAGMA cache_size=-65536")
+                try:
+                    # Dates enregistrées des fiches importées (liste d'IDs passée en JSON : pas de limite de paramètres)
+                    cur.execute(
+                        "SELECT id, updated_at FROM fiches WHERE id IN (SELECT value FROM json_each(?))",
+                        (_json_encode(fiche_ids),)
+                    )
+                    existing = dict(cur.fetchall())
+                    existing_updated_at = pd.Series([existing.get(fiche_id) for fiche_id in fiche_ids], dtype=object)
+                    is_new = existing_updated_at.isna().to_numpy()
+                    old_updated_at = pd.to_datetime(existing_updated_at, errors="coerce", format="ISO8601", utc=True)
+                    is_newer = (
+                        ~is_new
+                        & (new_updated_at.isna() | old_updated_at.isna() | (new_updated_at > old_updated_at)).to_numpy()
+                    )
+                    
+                    changes_before = conn.total_changes
+                    cur.executemany(
+                        "UPDATE fiches SET rcp_code = ?, updated_at = ?, payload_json = ? WHERE id = ?",
+                        [
+                            (rcp_code, updated_at, payload_json, fiche_id)
+                            for (fiche_id, rcp_code, _, updated_at, payload_json), newer in zip(fiche_params, is_newer)
+                            if newer
+                        ]
+                    )
+                    updated = conn.total_changes - changes_before
+                    cur.executemany(
+                        """
+                        INSERT INTO fiches (id, rcp_code, created_at, updated_at, payload_json) VALUES (?, ?, ?, ?, ?)
+                        ON CONFLICT(id) DO NOTHING
+                        """,
+                        [params for params, new in zip(fiche_params, is_new) if new]
+                    )
+                    inserted = conn.total_changes - changes_before - updated
+                    # Mettre à jour la date de modification de la RCP dans la même transaction
+                    if inserted or updated:
+                        cur.execute(_SQL_TOUCH_RCP, (now, target_rcp_code))
+                    return inserted, updated
+                finally:
+                    cur.execute(f"PRAGMA cache_size={cache_size}")
             
-            db_write(_process_batch)
+            imported_fiches, updated_fiches = db_write(_process_fiches)
+            skipped_older = len(fiche_params) - imported_fiches - updated_fiches
         
-        # Mettre à jour la date de modification de la RCP une seule fois à la fin
         if imported_fiches > 0 or updated_fiches > 0:
-            def _update_rcp_date(conn, cur):
-                cur.execute("UPDATE rcp SET updated_at = ? WHERE code = ?", (now, target_rcp_code))
-            
-            db_write(_update_rcp_date)
-            # Invalider le cache
-            get_all_rcp.clear()
-            load_fiches.clear()
+            # Invalider tout le cache des fiches : l'UPSERT a pu déplacer des fiches d'autres RCP
+            invalidate_fiches_cache()
         
         message = f"Import terminé: {imported_fiches} fiches créées, {updated_fiches} fiches mises à jour dans la RCP {target_rcp_code}."
         if skipped_older > 0:
@@ -999,36 +1263,85 @@ def import_rcp_from_csv(uploaded_file, target_rcp_code: str) -> dict:
 # ---------------------------
 # Streamlit UI
 # ---------------------------
+@lru_cache(maxsize=4096)  # Fonction pure : les mêmes dates reviennent à chaque rerun
 def format_date_fr(date_str: str) -> str:
     """Formate une date au format 'jour mois année' en français."""
     if not date_str or date_str == 'None':
         return "Non renseignée"
     try:
-        date_obj = datetime.strptime(date_str, "%Y-%m-%d")
-        mois_fr = [
-            "janvier", "février", "mars", "avril", "mai", "juin",
-            "juillet", "août", "septembre", "octobre", "novembre", "décembre"
-        ]
+        date_obj = date.fromisoformat(date_str[:10])
         jour = date_obj.day
-        mois = mois_fr[date_obj.month - 1]
+        mois = _MOIS_FR[date_obj.month - 1]
         annee = date_obj.year
         return f"{jour} {mois} {annee}"
-    except:
+    except ValueError:
         return date_str
 
 
+def enrich_rcp_list(rcp_list: list) -> list:
+    """Ajoute à chaque RCP ses champs d'affichage, calculés une seule fois par rendu."""
+    return [
+        {
+            **rcp,
+            "_date_display": format_date_fr(rcp.get('date_rcp', '')),
+            "_created": rcp['created_at'][:10],
+            "_updated": rcp['updated_at'][:10],
+            "_status": "Archivée" if rcp.get('is_archived', False) else "Active",
+        }
+        for rcp in rcp_list
+    ]
+
+
+_MOTIF_OPTIONS = ("IUE", "POP", "autre")
+
+# Antécédents Oui/Non du formulaire (libellé = clé du payload), dans l'ordre d'affichage
+_ANTECEDENT_LABELS = (
+    "Rééducation périnéo-sphinctérienne",
+    "ATCD maladie neurologique",
+    "ATCD chirurgie incontinence urinaire",
+    "ATCD chirurgie prolapsus (POP)",
+    "ATCD chirurgie pelvienne autre que POP",
+    "ATCD irradiation pelvienne",
+    "Troubles ano-rectaux",
+    "Troubles génito-sexuels",
+    "Ménopause",
+)
+
+
+@lru_cache(maxsize=128)
+def _normalize_motif(motif: str) -> str:
+    """Ramène un motif (y compris les anciens libellés libres) à l'une des options du formulaire."""
+    if motif in _MOTIF_OPTIONS:
+        return motif
+    motif_lower = motif.lower()
+    if "effort" in motif_lower:
+        return "IUE"
+    if "prolapsus" in motif_lower or "pop" in motif_lower:
+        return "POP"
+    return "autre"
+
+
+@lru_cache(maxsize=512)  # Recalculé à chaque rerun du formulaire avec les mêmes saisies
 def compute_imc(poids_kg, taille_cm):
     try:
         p = float(poids_kg) if poids_kg not in (None, "",) else None
         t = float(taille_cm) if taille_cm not in (None, "",) else None
-        if p and t and t > 0:
+        # Valeurs non finies ("nan", "inf") refusées : elles ne doivent pas finir dans le payload
+        if p and t and t > 0 and math.isfinite(p) and math.isfinite(t):
             t_m = t / 100.0
-            return round(p / (t_m * t_m), 1)
+            imc = p / (t_m * t_m)
+            if math.isfinite(imc):
+                return round(imc, 1)
     except Exception:
         pass
     return None
 
 
+def _set_session_state(**values):
+    """Callback de bouton : met à jour session_state avant le rerun déclenché par le clic."""
+    st.session_state.update(values)
+
+
 def show_database_page():
     """Affiche toutes les fiches dans un tableau."""
     st.title("🗄️ Base de données")
@@ -1041,22 +1354,20 @@ def show_database_page():
     
     st.divider()
     
+    # Colonnes à afficher, seules chargées depuis la base
+    display_columns = ("rcp_code", "patiente_nom", "rcp_date", "chirurgien", "created_at", "updated_at")
+    
     # Charger toutes les fiches
-    df_all_fiches = load_fiches()
+    df_all_fiches = load_fiches(columns=display_columns)
     
     if df_all_fiches.empty:
         st.info("Aucune fiche enregistrée.")
     else:
-        # Sélectionner les colonnes à afficher
-        display_columns = ["rcp_code", "patiente_nom", "rcp_date", "chirurgien", "created_at", "updated_at"]
         
         # Filtrer les colonnes qui existent
         available_columns = [col for col in display_columns if col in df_all_fiches.columns]
         
-        # Créer un DataFrame avec les colonnes sélectionnées
-        df_display = df_all_fiches[available_columns].copy()
-        
-        # Renommer les colonnes pour un affichage plus lisible
+        # Noms de colonnes plus lisibles pour l'affichage
         column_names = {
             "rcp_code": "Code RCP",
             "patiente_nom": "Patiente",
@@ -1065,13 +1376,13 @@ def show_database_page():
             "created_at": "Créée le",
             "updated_at": "Modifiée le"
         }
-        df_display = df_display.rename(columns=column_names)
+        # Sélection et renommage sans copie explicite : avec le copy-on-write de pandas,
+        # les colonnes non modifiées restent partagées avec df_all_fiches
+        df_display = df_all_fiches[available_columns].rename(columns=column_names)
         
-        # Formater les dates
-        if "Créée le" in df_display.columns:
-            df_display["Créée le"] = df_display["Créée le"].apply(lambda x: x[:10] if isinstance(x, str) and len(x) >= 10 else x)
-        if "Modifiée le" in df_display.columns:
-            df_display["Modifiée le"] = df_display["Modifiée le"].apply(lambda x: x[:10] if isinstance(x, str) and len(x) >= 10 else x)
+        # Formater les dates (partie AAAA-MM-JJ) : seules ces colonnes sont recréées
+        date_columns = [col for col in ("Créée le", "Modifiée le") if col in df_display.columns]
+        df_display = df_display.assign(**{col: df_display[col].str.slice(0, 10) for col in date_columns})
         
         # Afficher le tableau
         st.dataframe(df_display, use_container_width=True, height=600)
@@ -1095,27 +1406,23 @@ def show_liste_rcp_page():
     st.title("📋 Liste des RCP")
     st.caption("Vue d'ensemble de toutes les RCP créées.")
     
-    # Liste des RCP
-    rcp_list = get_all_rcp()
+    # Liste des RCP, avec les champs d'affichage partagés par le tableau et la liste détaillée
+    rcp_list = enrich_rcp_list(get_all_rcp())
     if not rcp_list:
         st.info("Aucune RCP créée.")
     else:
         # Créer un DataFrame pour un affichage en tableau
-        rcp_data = []
-        for rcp in rcp_list:
-            date_rcp_display = format_date_fr(rcp.get('date_rcp', ''))
-            created_date = rcp['created_at'][:10] if len(rcp['created_at']) >= 10 else rcp['created_at']
-            updated_date = rcp['updated_at'][:10] if len(rcp['updated_at']) >= 10 else rcp['updated_at']
-            status = "Archivée" if rcp.get('is_archived', False) else "Active"
-            
-            rcp_data.append({
-                "Date RCP": date_rcp_display,
+        rcp_data = [
+            {
+                "Date RCP": rcp['_date_display'],
                 "Code": rcp['code'],
                 "Nombre de fiches": rcp['nb_fiches'],
-                "Statut": status,
-                "Créée le": created_date,
-                "Modifiée le": updated_date
-            })
+                "Statut": rcp['_status'],
+                "Créée le": rcp['_created'],
+                "Modifiée le": rcp['_updated']
+            }
+            for rcp in rcp_list
+        ]
         
         df_rcp = pd.DataFrame(rcp_data)
         
@@ -1146,17 +1453,14 @@ def show_liste_rcp_page():
             with st.container():
                 col1, col2, col3, col4, col5 = st.columns([3, 2, 2, 2, 1])
                 with col1:
-                    date_rcp_display = format_date_fr(rcp.get('date_rcp', ''))
                     status_text = " (Archivée)" if rcp.get('is_archived', False) else ""
-                    st.markdown(f"**Date RCP:** {date_rcp_display}{status_text}")
+                    st.markdown(f"**Date RCP:** {rcp['_date_display']}{status_text}")
                 with col2:
                     st.markdown(f"**Fiches:** {rcp['nb_fiches']}")
                 with col3:
-                    created_date = rcp['created_at'][:10] if len(rcp['created_at']) >= 10 else rcp['created_at']
-                    st.caption(f"Créé le: {created_date}")
+                    st.caption(f"Créé le: {rcp['_created']}")
                 with col4:
-                    updated_date = rcp['updated_at'][:10] if len(rcp['updated_at']) >= 10 else rcp['updated_at']
-                    st.caption(f"Modifié le: {updated_date}")
+                    st.caption(f"Modifié le: {rcp['_updated']}")
                 with col5:
                     if st.button("📂 Ouvrir", key=f"open_liste_{rcp['code']}"):
                         st.session_state["page"] = "rcp_detail"
@@ -1173,7 +1477,7 @@ def show_home_page():
     # Formulaire pour créer une nouvelle RCP
     with st.expander("➕ Créer une nouvelle RCP", expanded=False):
         with st.form("create_rcp_form"):
-            date_rcp = st.date_input("Date de la RCP", value=datetime.now().date())
+            date_rcp = st.date_input("Date de la RCP", value=date.today())
             submitted = st.form_submit_button("Créer la RCP", type="primary")
             if submitted:
                 date_str = date_rcp.strftime("%Y-%m-%d")
@@ -1187,7 +1491,7 @@ def show_home_page():
     st.divider()
     
     # Liste des RCP
-    rcp_list = get_all_rcp()
+    rcp_list = enrich_rcp_list(get_all_rcp())
     if not rcp_list:
         st.info("Aucune RCP créée. Créez-en une nouvelle ci-dessus.")
     else:
@@ -1196,13 +1500,11 @@ def show_home_page():
             with st.container():
                 col1, col2, col3, col4 = st.columns([3, 2, 2, 1])
                 with col1:
-                    date_rcp_display = format_date_fr(rcp.get('date_rcp', ''))
-                    st.markdown(f"**Date RCP:** {date_rcp_display}")
+                    st.markdown(f"**Date RCP:** {rcp['_date_display']}")
                 with col2:
                     st.markdown(f"**Fiches:** {rcp['nb_fiches']}")
                 with col3:
-                    created_date = rcp['created_at'][:10] if len(rcp['created_at']) >= 10 else rcp['created_at']
-                    st.caption(f"Créé le: {created_date}")
+                    st.caption(f"Créé le: {rcp['_created']}")
                 with col4:
                     if st.button("📂 Ouvrir", key=f"open_{rcp['code']}"):
                         st.session_state["page"] = "rcp_detail"
@@ -1213,9 +1515,8 @@ def show_home_page():
 
 def show_rcp_detail_page(rcp_code: str):
     """Affiche la page de détail d'une RCP avec ses fiches."""
-    # Récupérer les infos de la RCP
-    rcp_list = get_all_rcp()
-    current_rcp = next((r for r in rcp_list if r['code'] == rcp_code), None)
+    # Récupérer les infos de la RCP (lecture par code, sans parcourir toute la liste)
+    current_rcp = get_rcp(rcp_code)
     
     # Afficher le titre avec la date de la RCP
     date_rcp_display = "RCP"
@@ -1287,21 +1588,21 @@ def show_rcp_detail_page(rcp_code: str):
         with col_title:
             st.markdown("### 📄 Générer PDF du dossier")
         with col_close:
-            if st.button("❌", key="close_pdf_x", help="Fermer"):
-                st.session_state["show_pdf_dialog"] = False
-                st.rerun()
+            st.button("❌", key="close_pdf_x", help="Fermer", on_click=_set_session_state, kwargs={"show_pdf_dialog": False})
         
         st.caption(f"Génère un PDF complet avec toutes les fiches de la RCP.")
         
-        df_check = load_fiches(rcp_code)
+        df_check = load_fiches(rcp_code, columns=("id",))
         if df_check.empty:
             st.warning("Aucune fiche dans cette RCP.")
         else:
             if st.button("Générer les PDFs", type="primary", key="generate_pdf_btn"):
                 try:
-                    pdf_paths = generate_pdf_rcp(rcp_code)
-                    st.success(f"{len(pdf_paths)} PDF(s) généré(s) avec succès.")
-                    for pdf_path in pdf_paths:
+                    # Message de succès affiché au-dessus de la liste, une fois tous les PDF générés
+                    status = st.empty()
+                    nb_pdfs = 0
+                    for pdf_path in generate_pdf_rcp(rcp_code):
+                        nb_pdfs += 1
                         st.code(pdf_path)
                         with open(pdf_path, "rb") as f:
                             filename = os.path.basename(pdf_path)
@@ -1312,6 +1613,7 @@ def show_rcp_detail_page(rcp_code: str):
                                 mime="application/pdf",
                                 key=f"dl_{filename}"
                             )
+                    status.success(f"{nb_pdfs} PDF(s) généré(s) avec succès.")
                 except Exception as e:
                     st.error(f"Erreur lors de la génération des PDFs: {str(e)}")
         
@@ -1323,9 +1625,7 @@ def show_rcp_detail_page(rcp_code: str):
         with col_title:
             st.markdown("### 📥 Exporter CSV")
         with col_close:
-            if st.button("❌", key="close_export_x", help="Fermer"):
-                st.session_state["show_export_dialog"] = False
-                st.rerun()
+            st.button("❌", key="close_export_x", help="Fermer", on_click=_set_session_state, kwargs={"show_export_dialog": False})
         
         st.caption(f"Exporte cette RCP et ses fiches pour synchronisation.")
         
@@ -1347,9 +1647,7 @@ def show_rcp_detail_page(rcp_code: str):
         with col_title:
             st.markdown("### 📤 Importer CSV")
         with col_close:
-            if st.button("❌", key="close_import_x", help="Fermer"):
-                st.session_state["show_import_dialog"] = False
-                st.rerun()
+            st.button("❌", key="close_import_x", help="Fermer", on_click=_set_session_state, kwargs={"show_import_dialog": False})
         
         st.caption(f"Importez un fichier CSV pour synchroniser les fiches dans cette RCP ({rcp_code}).")
         
@@ -1390,7 +1688,7 @@ def show_rcp_detail_page(rcp_code: str):
     st.divider()
     
     # Liste des fiches
-    df_fiches = load_fiches(rcp_code)
+    df_fiches = load_fiches(rcp_code, columns=("id", "patiente_nom", "rcp_date", "created_at"))
     if df_fiches.empty:
         st.info("Aucune fiche dans ce dossier. Cliquez sur 'Ajouter une fiche' pour commencer.")
     else:
@@ -1488,6 +1786,76 @@ def save_fiche_data(fiche_id: str, rcp_code: str, rcp_date: str, chirurgien: str
         return False
 
 
+@st.fragment
+def _render_pdf_fiche_dialog():
+    """Affiche le PDF généré pour la fiche ; ses interactions ne relancent que ce fragment."""
+    # Condition réévaluée ici : un rerun du fragment ne repasse pas par show_fiche_form_page
+    if not (st.session_state.get("show_pdf_fiche_dialog", False) and st.session_state.get("generated_pdf_path")):
+        return
+    st.divider()
+    col_title, col_close = st.columns([10, 1])
+    with col_title:
+        st.markdown("### 📄 PDF généré")
+    with col_close:
+        # Callback : l'état est mis à jour avant le rerun du fragment, qui n'affiche alors plus rien
+        st.button("❌", key="close_pdf_fiche_x", help="Fermer", on_click=_set_session_state,
+                  kwargs={"show_pdf_fiche_dialog": False, "generated_pdf_path": None})
+    
+    pdf_path = st.session_state["generated_pdf_path"]
+    st.success("PDF généré avec succès.")
+    st.code(pdf_path)
+    # Le fichier n'est relu que s'il a changé, pas à chaque rerun
+    st.download_button(
+        "Télécharger le PDF",
+        _read_pdf_bytes(pdf_path, os.path.getmtime(pdf_path)),
+        file_name=os.path.basename(pdf_path),
+        mime="application/pdf",
+        key="dl_fiche_pdf"
+    )
+    st.divider()
+
+
+@st.cache_data(ttl=60)  # Invalidé avec les listes de RCP
+def _transfer_options(rcp_code: str) -> dict:
+    """Libellés « code - date » des RCP vers lesquelles transférer une fiche de rcp_code, par code."""
+    return {r['code']: f"{r['code']} - {format_date_fr(r.get('date_rcp', ''))}" for r in get_all_rcp_except(rcp_code)}
+
+
+@st.fragment
+def _render_transfer_dialog(fiche_id: str, rcp_code: str):
+    """Interface de transfert d'une fiche ; ses interactions ne relancent que ce fragment, sauf après transfert."""
+    if not st.session_state.get("show_transfer", False):
+        return
+    st.divider()
+    st.markdown("### Transférer la fiche vers une autre RCP")
+    
+    # RCP de destination possibles (toutes sauf la RCP actuelle), libellés déjà formatés
+    rcp_options = _transfer_options(rcp_code)
+    
+    if not rcp_options:
+        st.warning("Aucune autre RCP disponible pour le transfert.")
+    else:
+        target_rcp = st.selectbox(
+            "Sélectionner la RCP de destination",
+            tuple(rcp_options),
+            format_func=rcp_options.__getitem__
+        )
+        
+        col1, col2 = st.columns([1, 5])
+        with col1:
+            if st.button("✅ Confirmer le transfert", type="primary"):
+                if transfer_fiche(fiche_id, target_rcp):
+                    st.success(f"Fiche transférée vers la RCP {target_rcp}.")
+                    st.session_state["show_transfer"] = False
+                    st.session_state["current_rcp_code"] = target_rcp
+                    st.session_state["page"] = "rcp_detail"
+                    st.rerun()
+                else:
+                    st.error("Erreur lors du transfert.")
+        with col2:
+            st.button("❌ Annuler", on_click=_set_session_state, kwargs={"show_transfer": False})
+
+
 def show_fiche_form_page(rcp_code: str, fiche_id: str):
     """Affiche le formulaire de saisie/modification d'une fiche."""
     st.title("📝 Formulaire de fiche")
@@ -1525,7 +1893,7 @@ def show_fiche_form_page(rcp_code: str, fiche_id: str):
             if st.button("📄 Générer PDF", key="generate_pdf_fiche_btn"):
                 try:
                     payload = fiche_data["payload"]
-                    pdf_path = generate_pdf_fiche(fiche_id, payload, rcp_code)
+                    pdf_path = get_pdf_fiche(fiche_id, payload, rcp_code)
                     st.session_state["generated_pdf_path"] = pdf_path
                     st.session_state["show_pdf_fiche_dialog"] = True
                     st.rerun()
@@ -1533,70 +1901,11 @@ def show_fiche_form_page(rcp_code: str, fiche_id: str):
                     st.error(f"Erreur lors de la génération du PDF: {str(e)}")
     
     # Dialog pour afficher le PDF généré
-    if st.session_state.get("show_pdf_fiche_dialog", False) and st.session_state.get("generated_pdf_path"):
-        st.divider()
-        col_title, col_close = st.columns([10, 1])
-        with col_title:
-            st.markdown("### 📄 PDF généré")
-        with col_close:
-            if st.button("❌", key="close_pdf_fiche_x", help="Fermer"):
-                st.session_state["show_pdf_fiche_dialog"] = False
-                st.session_state["generated_pdf_path"] = None
-                st.rerun()
-        
-        pdf_path = st.session_state["generated_pdf_path"]
-        st.success("PDF généré avec succès.")
-        st.code(pdf_path)
-        with open(pdf_path, "rb") as f:
-            st.download_button(
-                "Télécharger le PDF",
-                f,
-                file_name=os.path.basename(pdf_path),
-                mime="application/pdf",
-                key="dl_fiche_pdf"
-            )
-        st.divider()
+    _render_pdf_fiche_dialog()
     
     # Interface de transfert
-    if st.session_state.get("show_transfer", False) and fiche_data:
-        st.divider()
-        st.markdown("### Transférer la fiche vers une autre RCP")
-        
-        # Récupérer toutes les RCP (sauf la RCP actuelle)
-        all_rcp = get_all_rcp()
-        rcp_options = [r for r in all_rcp if r['code'] != rcp_code]
-        
-        if not rcp_options:
-            st.warning("Aucune autre RCP disponible pour le transfert.")
-        else:
-            # Créer une liste d'options avec la date de la RCP
-            rcp_display = []
-            for r in rcp_options:
-                date_str = format_date_fr(r.get('date_rcp', ''))
-                rcp_display.append(f"{r['code']} - {date_str}")
-            
-            selected_idx = st.selectbox(
-                "Sélectionner la RCP de destination",
-                range(len(rcp_display)),
-                format_func=lambda x: rcp_display[x] if x < len(rcp_display) else ""
-            )
-            
-            col1, col2 = st.columns([1, 5])
-            with col1:
-                if st.button("✅ Confirmer le transfert", type="primary"):
-                    target_rcp = rcp_options[selected_idx]['code']
-                    if transfer_fiche(fiche_id, target_rcp):
-                        st.success(f"Fiche transférée vers la RCP {target_rcp}.")
-                        st.session_state["show_transfer"] = False
-                        st.session_state["current_rcp_code"] = target_rcp
-                        st.session_state["page"] = "rcp_detail"
-                        st.rerun()
-                    else:
-                        st.error("Erreur lors du transfert.")
-            with col2:
-                if st.button("❌ Annuler"):
-                    st.session_state["show_transfer"] = False
-                    st.rerun()
+    if fiche_data:
+        _render_transfer_dialog(fiche_id, rcp_code)
     
     # Masquer le code RCP et l'ID de la fiche (commentés pour ne plus les afficher)
     # st.markdown(f"**RCP:** {rcp_code}")
@@ -1610,9 +1919,14 @@ def show_fiche_form_page(rcp_code: str, fiche_id: str):
         # Vérifier que la fiche appartient bien à la RCP courante
         if fiche_data["rcp_code"] != rcp_code:
             st.warning(f"Cette fiche appartient à la RCP {fiche_data['rcp_code']}, pas à {rcp_code}.")
+    # Valeurs du payload converties une fois pour les champs texte (vide si absent ou falsy)
+    payload_str = {k: str(v) if v else "" for k, v in payload.items()}
     
-    # Récupérer la date de la RCP depuis la base de données
-    rcp_date_from_db = get_rcp_date(rcp_code)
+    # Récupérer la date de la RCP : déjà lue avec la fiche si elle appartient à cette RCP
+    if fiche_data and fiche_data["rcp_code"] == rcp_code:
+        rcp_date_from_db = fiche_data["rcp_date"]
+    else:
+        rcp_date_from_db = get_rcp_date(rcp_code)
     
     # Utiliser la date de la RCP si c'est une nouvelle fiche, sinon utiliser la valeur existante
     default_rcp_date = rcp_date_from_db if not fiche_data else payload.get("rcp_date", rcp_date_from_db)
@@ -1633,24 +1947,14 @@ def show_fiche_form_page(rcp_code: str, fiche_id: str):
                 chirurgien = st.text_input("Chirurgien responsable", value=payload.get("chirurgien", ""), key="form_chirurgien")
         
         # Champ Motif à la fin de la section Identité (synchronisé avec celui des Symptômes)
-        motif_options = ["IUE", "POP", "autre"]
+        motif_options = _MOTIF_OPTIONS
         # Initialiser la valeur partagée depuis le payload
         if "motif_shared" not in st.session_state:
-            motif_value_shared = payload.get("motif", payload.get("iu_type", "IUE"))
             # Convertir l'ancienne valeur si nécessaire
-            if motif_value_shared not in motif_options:
-                if "effort" in str(motif_value_shared).lower():
-                    motif_value_shared = "IUE"
-                elif "prolapsus" in str(motif_value_shared).lower() or "pop" in str(motif_value_shared).lower():
-                    motif_value_shared = "POP"
-                else:
-                    motif_value_shared = "autre"
-            st.session_state.motif_shared = motif_value_shared
+            st.session_state.motif_shared = _normalize_motif(str(payload.get("motif", payload.get("iu_type", "IUE"))))
         
-        try:
-            motif_index_identite = motif_options.index(st.session_state.motif_shared) if st.session_state.motif_shared in motif_options else 0
-        except:
-            motif_index_identite = 0
+        motif_shared = st.session_state.motif_shared
+        motif_index_identite = motif_options.index(motif_shared) if motif_shared in motif_options else 0
         motif_identite = st.selectbox("Motif", motif_options, index=motif_index_identite, key="motif_identite")
         # Mettre à jour la valeur partagée (utiliser .get() pour éviter les erreurs)
         if "motif_shared" not in st.session_state or st.session_state.get("motif_shared") != motif_identite:
@@ -1667,14 +1971,13 @@ def show_fiche_form_page(rcp_code: str, fiche_id: str):
         # Checkboxes Oui/Non avec possibilité de décocher (NA si aucun coché)
         def yn(label, key):
             current = payload.get("antecedents", {}).get(key, "NA")
-            with st.container():
-                st.markdown(f"**{label}**")
-                col_oui, col_non = st.columns(2)
-                with col_oui:
-                    checked_oui = st.checkbox("✓ Oui", value=(current == "Oui"), key=f"oui_{key}")
-                with col_non:
-                    checked_non = st.checkbox("✗ Non", value=(current == "Non"), key=f"non_{key}")
-                st.markdown("<br>", unsafe_allow_html=True)  # Espacement
+            # Espacement après les checkboxes assuré par le CSS global
+            st.markdown(f"**{label}**")
+            col_oui, col_non = st.columns(2)
+            with col_oui:
+                checked_oui = st.checkbox("✓ Oui", value=(current == "Oui"), key=f"oui_{key}")
+            with col_non:
+                checked_non = st.checkbox("✗ Non", value=(current == "Non"), key=f"non_{key}")
             
             # Si les deux sont cochés, prioriser "Oui"
             if checked_oui:
@@ -1685,20 +1988,11 @@ def show_fiche_form_page(rcp_code: str, fiche_id: str):
                 return "NA"
 
         antecedents = {}
-        with a1:
-            antecedents["Rééducation périnéo-sphinctérienne"] = yn("Rééducation périnéo-sphinctérienne", "Rééducation périnéo-sphinctérienne")
-            antecedents["ATCD maladie neurologique"] = yn("ATCD maladie neurologique", "ATCD maladie neurologique")
-            antecedents["ATCD chirurgie incontinence urinaire"] = yn("ATCD chirurgie incontinence urinaire", "ATCD chirurgie incontinence urinaire")
-
-        with a2:
-            antecedents["ATCD chirurgie prolapsus (POP)"] = yn("ATCD chirurgie prolapsus (POP)", "ATCD chirurgie prolapsus (POP)")
-            antecedents["ATCD chirurgie pelvienne autre que POP"] = yn("ATCD chirurgie pelvienne autre que POP", "ATCD chirurgie pelvienne autre que POP")
-            antecedents["ATCD irradiation pelvienne"] = yn("ATCD irradiation pelvienne", "ATCD irradiation pelvienne")
-
-        with a3:
-            antecedents["Troubles ano-rectaux"] = yn("Troubles ano-rectaux", "Troubles ano-rectaux")
-            antecedents["Troubles génito-sexuels"] = yn("Troubles génito-sexuels", "Troubles génito-sexuels")
-            antecedents["Ménopause"] = yn("Ménopause", "Ménopause")
+        # Remplissage colonne par colonne (trois antécédents par colonne), dans l'ordre du payload
+        for col, i in zip((a1, a2, a3), range(0, len(_ANTECEDENT_LABELS), 3)):
+            with col:
+                for label in _ANTECEDENT_LABELS[i:i + 3]:
+                    antecedents[label] = yn(label, label)
         
         # Champ texte libre pour les antécédents
         st.markdown("---")
@@ -1712,18 +2006,18 @@ def show_fiche_form_page(rcp_code: str, fiche_id: str):
         with st.container():
             col_s1, col_s2 = st.columns(2)
             with col_s1:
-                severite = st.text_input("Sévérité (nombre de protections / jour)", value=str(payload.get("severite_protections_j", "") or ""), key="form_severite")
+                severite = st.text_input("Sévérité (nombre de protections / jour)", value=payload_str.get("severite_protections_j", ""), key="form_severite")
             with col_s2:
-                gene_10 = st.text_input("Gêne globale (/10)", value=str(payload.get("gene_10", "") or ""), key="form_gene_10")
+                gene_10 = st.text_input("Gêne globale (/10)", value=payload_str.get("gene_10", ""), key="form_gene_10")
                 st.markdown("")  # Espacement
 
             c1, c2, c3 = st.columns(3)
             with c1:
-                score_usp = st.text_input("Score USP", value=str(payload.get("score_usp", "") or ""), key="form_score_usp")
+                score_usp = st.text_input("Score USP", value=payload_str.get("score_usp", ""), key="form_score_usp")
             with c2:
-                score_hav = st.text_input("Score HAV", value=str(payload.get("score_hav", "") or ""), key="form_score_hav")
+                score_hav = st.text_input("Score HAV", value=payload_str.get("score_hav", ""), key="form_score_hav")
             with c3:
-                dysurie = st.text_input("Dysurie", value=str(payload.get("dysurie", "") or ""), key="form_dysurie")
+                dysurie = st.text_input("Dysurie", value=payload_str.get("dysurie", ""), key="form_dysurie")
         
         # Champ texte libre pour les symptômes
         st.markdown("---")
@@ -1738,73 +2032,41 @@ def show_fiche_form_page(rcp_code: str, fiche_id: str):
         st.markdown("#### Anthropométrie")
         anthro_col1, anthro_col2, anthro_col3 = st.columns(3)
         with anthro_col1:
-            poids_kg = st.text_input("Poids (kg)", value=str(payload.get("poids_kg", "") or ""), key="form_poids_kg")
+            poids_kg = st.text_input("Poids (kg)", value=payload_str.get("poids_kg", ""), key="form_poids_kg")
         with anthro_col2:
-            taille_cm = st.text_input("Taille (cm)", value=str(payload.get("taille_cm", "") or ""), key="form_taille_cm")
+            taille_cm = st.text_input("Taille (cm)", value=payload_str.get("taille_cm", ""), key="form_taille_cm")
         with anthro_col3:
-            imc = compute_imc(poids_kg, taille_cm)
-            st.text_input("IMC (calculé)", value=str(imc or ""), disabled=True, key="form_imc")
-            # L'IMC sera recalculé depuis poids_kg et taille_cm quand nécessaire
+            # IMC enregistré : il est recalculé depuis poids_kg et taille_cm à l'enregistrement
+            st.text_input("IMC (calculé)", value=payload_str.get("imc", ""), disabled=True, key="form_imc")
         
         st.markdown("---")
         st.markdown("#### Examen physique")
         ex1, ex2, ex3 = st.columns(3)
 
-        def ex_yn(label, key):
+        def ex_yn(label, key, true_label="Oui", false_label="Non"):
             current = payload.get("examen", {}).get(key, "NA")
-            with st.container():
-                st.markdown(f"**{label}**")
-                col_oui, col_non = st.columns(2)
-                with col_oui:
-                    checked_oui = st.checkbox("✓ Oui", value=(current == "Oui"), key=f"ex_oui_{key}")
-                with col_non:
-                    checked_non = st.checkbox("✗ Non", value=(current == "Non"), key=f"ex_non_{key}")
-                st.markdown("<br>", unsafe_allow_html=True)  # Espacement
+            # Espacement après les checkboxes assuré par le CSS global
+            st.markdown(f"**{label}**")
+            col_oui, col_non = st.columns(2)
+            with col_oui:
+                checked_oui = st.checkbox(f"✓ {true_label}", value=(current == true_label), key=f"ex_{true_label.lower()}_{key}")
+            with col_non:
+                checked_non = st.checkbox(f"✗ {false_label}", value=(current == false_label), key=f"ex_{false_label.lower()}_{key}")
             
-            # Si les deux sont cochés, prioriser "Oui"
+            # Si les deux sont cochés, prioriser la réponse positive
             if checked_oui:
-                return "Oui"
+                return true_label
             elif checked_non:
-                return "Non"
+                return false_label
             else:
                 return "NA"
 
         examen = {}
         with ex1:
             examen["Hypermobilité urétrale"] = ex_yn("Hypermobilité urétrale", "Hypermobilité urétrale")
-            # Test à la toux avec checkboxes
-            test_toux_current = payload.get("examen", {}).get("Test à la toux (positif)", "NA")
-            with st.container():
-                st.markdown("**Test à la toux**")
-                col_positif, col_negatif = st.columns(2)
-                with col_positif:
-                    checked_positif = st.checkbox("✓ Positif", value=(test_toux_current == "Positif"), key="test_toux_positif")
-                with col_negatif:
-                    checked_negatif = st.checkbox("✗ Négatif", value=(test_toux_current == "Négatif"), key="test_toux_negatif")
-                st.markdown("<br>", unsafe_allow_html=True)  # Espacement
-            if checked_positif:
-                examen["Test à la toux (positif)"] = "Positif"
-            elif checked_negatif:
-                examen["Test à la toux (positif)"] = "Négatif"
-            else:
-                examen["Test à la toux (positif)"] = "NA"
+            examen["Test à la toux (positif)"] = ex_yn("Test à la toux", "Test à la toux (positif)", "Positif", "Négatif")
         with ex2:
-            # Manœuvre de soutènement avec checkboxes
-            manoeuvre_current = payload.get("examen", {}).get("Manœuvre de soutènement (positive)", "NA")
-            with st.container():
-                st.markdown("**Manœuvre de soutènement**")
-                col_positive, col_negative = st.columns(2)
-                with col_positive:
-                    checked_positive = st.checkbox("✓ Positive", value=(manoeuvre_current == "Positive"), key="manoeuvre_positive")
-                with col_negative:
-                    checked_negative = st.checkbox("✗ Négative", value=(manoeuvre_current == "Négative"), key="manoeuvre_negative")
-                st.markdown("<br>", unsafe_allow_html=True)  # Espacement
-            if checked_positive:
-                examen["Manœuvre de soutènement (positive)"] = "Positive"
-            elif checked_negative:
-                examen["Manœuvre de soutènement (positive)"] = "Négative"
-            else:
-                examen["Manœuvre de soutènement (positive)"] = "NA"
+            examen["Manœuvre de soutènement (positive)"] = ex_yn("Manœuvre de soutènement", "Manœuvre de soutènement (positive)", "Positive", "Négative")
             examen["Inversion de commande"] = ex_yn("Inversion de commande", "Inversion de commande")
         with ex3:
             examen["Prolapsus associé"] = ex_yn("Prolapsus associé", "Prolapsus associé")
@@ -1827,11 +2089,11 @@ def show_fiche_form_page(rcp_code: str, fiche_id: str):
         with st.container():
             d1, d2, d3, d4 = st.columns(4)
             with d1:
-                qmax = st.text_input("Qmax (mL/s)", value=str(payload.get("qmax_ml_s", "") or ""), key="form_qmax")
+                qmax = st.text_input("Qmax (mL/s)", value=payload_str.get("qmax_ml_s", ""), key="form_qmax")
             with d2:
-                volume_urine = st.text_input("Volume uriné (mL)", value=str(payload.get("volume_urine_ml", "") or ""), key="form_volume_urine")
+                volume_urine = st.text_input("Volume uriné (mL)", value=payload_str.get("volume_urine_ml", ""), key="form_volume_urine")
             with d3:
-                rpm = st.text_input("RPM (mL)", value=str(payload.get("rpm_ml", "") or ""), key="form_rpm")
+                rpm = st.text_input("RPM (mL)", value=payload_str.get("rpm_ml", ""), key="form_rpm")
             with d4:
                 courbe_normale = st.radio(
                     "Courbe normale",
@@ -1860,6 +2122,7 @@ def show_fiche_form_page(rcp_code: str, fiche_id: str):
         if submitted or submitted_top:
             # Récupérer la valeur du motif depuis le widget de la section Identité
             motif_value = motif_identite
+            imc = compute_imc(poids_kg, taille_cm)
             
             # Utiliser la fonction helper pour enregistrer
             success = save_fiche_data(
@@ -1879,88 +2142,99 @@ def show_fiche_form_page(rcp_code: str, fiche_id: str):
                 st.rerun()
 
 
+# CSS personnalisé de l'application (injecté à chaque exécution par main)
+_APP_CSS = """
+<style>
+/* Empêcher l'étirement vertical des boutons dans les colonnes */
+div[data-testid="column"] button {
+    height: auto !important;
+    min-height: 38px !important;
+    padding-top: 0.5rem !important;
+    padding-bottom: 0.5rem !important;
+    white-space: normal !important;
+    word-wrap: break-word !important;
+}
+/* S'assurer que les colonnes n'étirent pas leur contenu verticalement */
+div[data-testid="column"] {
+    display: flex;
+    flex-direction: column;
+    align-items: flex-start;
+    justify-content: flex-start;
+}
+/* Empêcher les colonnes de forcer une hauteur minimale */
+div[data-testid="column"] > div {
+    height: auto !important;
+    min-height: auto !important;
+}
+/* Améliorer l'espacement des sections */
+h3 {
+    margin-top: 1.5rem !important;
+    margin-bottom: 1rem !important;
+    padding-bottom: 0.5rem !important;
+    border-bottom: 2px solid #e0e0e0 !important;
+}
+h4 {
+    margin-top: 1rem !important;
+    margin-bottom: 0.75rem !important;
+    color: #666 !important;
+}
+/* Améliorer l'espacement des conteneurs */
+.stContainer {
+    padding: 0.5rem 0 !important;
+}
+/* Améliorer la lisibilité des checkboxes */
+label[data-baseweb="checkbox"] {
+    font-size: 0.95rem !important;
+}
+/* Espacement sous les paires de checkboxes Oui/Non */
+div[data-testid="stCheckbox"] {
+    margin-bottom: 1rem;
+}
+</style>
+"""
+
+# JavaScript pour colorer les checkboxes Oui/Non et Positif/Négatif
+_APP_JS = """
+<script>
+// Colorer les checkboxes après le chargement de la page
+function colorCheckboxes() {
+    // Sélectionner tous les labels de checkboxes
+    const checkboxes = document.querySelectorAll('div[data-testid="stCheckbox"] label');
+    checkboxes.forEach(label => {
+        const text = label.textContent || label.innerText;
+        if (text.includes('✓ Oui') || text.includes('✓ Positif') || text.includes('✓ Positive')) {
+            label.style.color = '#28a745';
+            label.style.fontWeight = '500';
+        } else if (text.includes('✗ Non') || text.includes('✗ Négatif') || text.includes('✗ Négative')) {
+            label.style.color = '#dc3545';
+            label.style.fontWeight = '500';
+        }
+    });
+}
+// Exécuter au chargement et après chaque interaction Streamlit
+if (document.readyState === 'loading') {
+    document.addEventListener('DOMContentLoaded', colorCheckboxes);
+} else {
+    colorCheckboxes();
+}
+// Réexécuter après les mises à jour Streamlit
+const observer = new MutationObserver(colorCheckboxes);
+observer.observe(document.body, { childList: true, subtree: true });
+</script>
+"""
+
+
 def main():
     st.set_page_config(page_title=APP_TITLE, layout="wide")
     
     # CSS personnalisé pour améliorer la présentation
-    st.markdown("""
-        <style>
-        /* Empêcher l'étirement vertical des boutons dans les colonnes */
-        div[data-testid="column"] button {
-            height: auto !important;
-            min-height: 38px !important;
-            padding-top: 0.5rem !important;
-            padding-bottom: 0.5rem !important;
-            white-space: normal !important;
-            word-wrap: break-word !important;
-        }
-        /* S'assurer que les colonnes n'étirent pas leur contenu verticalement */
-        div[data-testid="column"] {
-            display: flex;
-            flex-direction: column;
-            align-items: flex-start;
-            justify-content: flex-start;
-        }
-        /* Empêcher les colonnes de forcer une hauteur minimale */
-        div[data-testid="column"] > div {
-            height: auto !important;
-            min-height: auto !important;
-        }
-        /* Améliorer l'espacement des sections */
-        h3 {
-            margin-top: 1.5rem !important;
-            margin-bottom: 1rem !important;
-            padding-bottom: 0.5rem !important;
-            border-bottom: 2px solid #e0e0e0 !important;
-        }
-        h4 {
-            margin-top: 1rem !important;
-            margin-bottom: 0.75rem !important;
-            color: #666 !important;
-        }
-        /* Améliorer l'espacement des conteneurs */
-        .stContainer {
-            padding: 0.5rem 0 !important;
-        }
-        /* Améliorer la lisibilité des checkboxes */
-        label[data-baseweb="checkbox"] {
-            font-size: 0.95rem !important;
-        }
-        </style>
-    """, unsafe_allow_html=True)
+    st.markdown(_APP_CSS, unsafe_allow_html=True)
     
     # JavaScript pour colorer les checkboxes
-    st.markdown("""
-        <script>
-        // Colorer les checkboxes après le chargement de la page
-        function colorCheckboxes() {
-            // Sélectionner tous les labels de checkboxes
-            const checkboxes = document.querySelectorAll('div[data-testid="stCheckbox"] label');
-            checkboxes.forEach(label => {
-                const text = label.textContent || label.innerText;
-                if (text.includes('✓ Oui') || text.includes('✓ Positif') || text.includes('✓ Positive')) {
-                    label.style.color = '#28a745';
-                    label.style.fontWeight = '500';
-                } else if (text.includes('✗ Non') || text.includes('✗ Négatif') || text.includes('✗ Négative')) {
-                    label.style.color = '#dc3545';
-                    label.style.fontWeight = '500';
-                }
-            });
-        }
-        // Exécuter au chargement et après chaque interaction Streamlit
-        if (document.readyState === 'loading') {
-            document.addEventListener('DOMContentLoaded', colorCheckboxes);
-        } else {
-            colorCheckboxes();
-        }
-        // Réexécuter après les mises à jour Streamlit
-        const observer = new MutationObserver(colorCheckboxes);
-        observer.observe(document.body, { childList: true, subtree: true });
-        </script>
-    """, unsafe_allow_html=True)
+    st.markdown(_APP_JS, unsafe_allow_html=True)
     
     ensure_dirs()
-    init_db()
+    init_db_once()
     
     # Initialiser la navigation
     if "page" not in st.session_state: